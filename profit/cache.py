@@ -0,0 +1,113 @@
+import os
+import pickle
+import hashlib
+import threading
+
+CACHE_VERSION = 1 # increase when discovery results change for the same input
+
+def log_digest(log):
+    """Return content hash of the log, i.e. of its variant table
+    (distinct traces and their counts).
+    """
+    variants = dict()
+    for trace in log.flat_log.values():
+        variants[trace] = variants.get(trace, 0) + 1
+    h = hashlib.sha256()
+    for trace, cnt in sorted((repr(v), c) for v, c in variants.items()):
+        h.update(trace.encode('utf-8'))
+        h.update(b'\x00' + str(cnt).encode('utf-8') + b'\x01')
+    return h.hexdigest()
+
+class DiscoveryCache(object):
+    """On-disk cache of discovery results with LRU eviction.
+
+    Each result is stored in a separate pickle file named by its key.
+    File modification time is the time of the last access, so that
+    the least recently used results are evicted first when the cache
+    exceeds its size.
+
+    Attributes
+    ----------
+    path: str
+        Directory to store results in
+    max_entries: int
+        Maximum number of results in the cache
+    max_bytes: int
+        Maximum total size of the results in bytes (default None,
+        i.e. not limited)
+
+    Examples
+    --------
+    >>> pm.set_params(cache='../PATH/CACHE-DIR')
+    >>> pm.update() # the second call with the same log is instant
+    """
+
+    def __init__(self, path, max_entries=128, max_bytes=None):
+        """Class Constructor."""
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, log, **params):
+        """Return a key of discovery result for the log and params."""
+        h = hashlib.sha256()
+        h.update(str(CACHE_VERSION).encode('utf-8'))
+        h.update(log_digest(log).encode('utf-8'))
+        for p in sorted(params):
+            h.update('{}={!r};'.format(p, params[p]).encode('utf-8'))
+        return h.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def get(self, key):
+        """Return cached result or None, if there is no such key."""
+        f = self._file(key)
+        try:
+            with open(f, 'rb') as fh:
+                value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try: os.utime(f) # mark as recently used
+        except OSError: pass
+        return value
+
+    def set(self, key, value):
+        """Store result and evict the least recently used ones."""
+        f = self._file(key)
+        # Unique per thread, as a cache may be shared by threads
+        tmp = '{}.{}.{}.tmp'.format(f, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as fh:
+            pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, f)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results while the cache
+        exceeds its size."""
+        entries = []
+        for fname in os.listdir(self.path):
+            if not fname.endswith('.pkl'):
+                continue
+            try: st = os.stat(os.path.join(self.path, fname))
+            except OSError: continue
+            entries.append((st.st_mtime, st.st_size, fname))
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        while entries and ((len(entries) > self.max_entries) |
+                           ((self.max_bytes is not None) and
+                            (total > self.max_bytes))):
+            _, size, fname = entries.pop(0)
+            try: os.remove(os.path.join(self.path, fname))
+            except OSError: pass
+            total -= size
+
+    def clear(self):
+        """Remove all results from the cache."""
+        for fname in os.listdir(self.path):
+            if fname.endswith('.pkl'):
+                os.remove(os.path.join(self.path, fname))
+
+    def __len__(self):
+        return len([f for f in os.listdir(self.path) if f.endswith('.pkl')])
@@ -0,0 +1,250 @@
+import types
+import numpy as np
+from collections.abc import Mapping
+from util_pm import transit_matrix, expand_edges
+
+class CompiledModel(object):
+    """Immutable process model compiled for batch conformance checking.
+
+    Activities are encoded as integers ('start' is 0, 'end' is 1) and
+    every transition (a_i, a_j) as a single integer key, so that model
+    edges and replay losses are looked up in sorted arrays instead of
+    nested dictionaries. The loss of a transition is the same as in
+    Graph.fitness: its case frequency in the log relative to the
+    number of cases, or a small epsilon for transitions never
+    observed in the log.
+
+    Attributes
+    ----------
+    activities: tuple
+        Encoded activities (the index of an activity is its code)
+    edges: frozenset
+        Model edges expanded to activities (see expand_edges)
+
+    See Also
+    ---------
+    Graph.compile
+    Graph.fitness
+
+    Examples
+    --------
+    >>> model = pm._Observers['Graph'].compile(pm.Log, pm._Observers['T'])
+    >>> scores = model.score(new_cases)
+    >>> scores['loss'], scores['deviations']
+    """
+    __slots__ = ('activities', 'edges', '_index', '_size', '_edge_keys',
+                 '_loss_keys', '_loss_vals', '_eps', '_model_loss')
+
+    def __init__(self, edges, T, case_cnt):
+        """Compile model edges and replay losses.
+
+        Parameters
+        ----------
+        edges: dict / list
+            Edges of the process model (see Graph)
+        T: dict
+            Transition matrix with 'start' and 'end' nodes
+            (see transit_matrix)
+        case_cnt: int
+            Number of cases in the log the model is discovered from
+        """
+        edges = expand_edges(edges)
+        activities = ['start', 'end']
+        index = {'start': 0, 'end': 1}
+        for a in list(T) + [a for e in edges for a in e]:
+            if a not in index:
+                index[a] = len(activities)
+                activities.append(a)
+        # The last code is reserved for activities unknown to the model
+        size = len(activities) + 1
+        edge_keys = np.array(sorted(index[a_i] * size + index[a_j]
+                                    for a_i, a_j in edges), dtype=np.int64)
+        loss = {index[a_i] * size + index[a_j]: T[a_i][a_j][1] / case_cnt
+                for a_i in T for a_j in T[a_i] if T[a_i][a_j][1] > 0}
+        loss_keys = np.array(sorted(loss), dtype=np.int64)
+        loss_vals = np.array([loss[k] for k in loss_keys], dtype=float)
+        eps = 10 ** (-len(str(case_cnt)))
+        for arr in [edge_keys, loss_keys, loss_vals]:
+            arr.flags.writeable = False
+
+        set_ = object.__setattr__
+        set_(self, 'activities', tuple(activities))
+        set_(self, 'edges', frozenset(edges))
+        set_(self, '_index', types.MappingProxyType(index))
+        set_(self, '_size', size)
+        set_(self, '_edge_keys', edge_keys)
+        set_(self, '_loss_keys', loss_keys)
+        set_(self, '_loss_vals', loss_vals)
+        set_(self, '_eps', eps)
+        set_(self, '_model_loss', float(self._lookup(edge_keys).sum()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledModel is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('CompiledModel is immutable')
+
+    def __reduce__(self):
+        # Index is pickled as a dictionary (mapping proxy is not picklable)
+        state = [getattr(self, s) for s in self.__slots__]
+        state[self.__slots__.index('_index')] = dict(self._index)
+        return (_restore, (tuple(state),))
+
+    def _lookup(self, keys):
+        """Return losses of encoded transitions."""
+        if not len(self._loss_keys):
+            return np.full(len(keys), self._eps)
+        pos = np.searchsorted(self._loss_keys, keys)
+        pos[pos == len(self._loss_keys)] = 0
+        found = self._loss_keys[pos] == keys
+        return np.where(found, self._loss_vals[pos], self._eps)
+
+    def _in_model(self, keys):
+        """Return mask of encoded transitions presented in the model."""
+        if not len(self._edge_keys):
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.searchsorted(self._edge_keys, keys)
+        pos[pos == len(self._edge_keys)] = 0
+        return self._edge_keys[pos] == keys
+
+    def encode(self, traces):
+        """Return traces encoded as a flat array of activity codes
+        surrounded by 'start' and 'end' codes, and an array of offsets
+        of the traces in it.
+        """
+        unknown = self._size - 1
+        get = self._index.get
+        lengths = np.fromiter((len(t) + 2 for t in traces), dtype=np.int64,
+                              count=len(traces))
+        offsets = np.zeros(len(traces) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        codes = np.fromiter((c for t in traces
+                             for c in (0, *(get(a, unknown) for a in t), 1)),
+                            dtype=np.int64, count=offsets[-1])
+        return codes, offsets
+
+    def replay(self, traces):
+        """Return transitions of the traces as encoded keys, a mask of
+        transitions absent in the model, and offsets of the traces in
+        the arrays of transitions.
+        """
+        return self._replay(*self.encode(traces))
+
+    def encode_codes(self, codes, offsets, labels):
+        """Return traces encoded by another codebook (e.g. the codes
+        and offsets of Log) in the codes of the model (see encode).
+        """
+        unknown = self._size - 1
+        trans = np.array([self._index.get(a, unknown) for a in labels],
+                         dtype=np.int64)
+        lengths = np.diff(offsets)
+        new_offsets = offsets - offsets[0] + 2 * np.arange(len(offsets))
+        new_codes = np.empty(new_offsets[-1], dtype=np.int64)
+        # Positions of the events after insertion of 'start' and 'end'
+        pos = np.arange(offsets[-1] - offsets[0]) + 1 + \
+              2 * np.repeat(np.arange(len(lengths)), lengths)
+        new_codes[pos] = trans[codes[offsets[0]:offsets[-1]]]
+        new_codes[new_offsets[:-1]] = 0
+        new_codes[new_offsets[1:] - 1] = 1
+        return new_codes, new_offsets
+
+    def _replay(self, codes, offsets):
+        """Replay encoded traces (see replay)."""
+        keys = codes[:-1] * self._size + codes[1:]
+        # Drop "transitions" between the end of a trace and the next one
+        keep = np.ones(len(keys), dtype=bool)
+        keep[offsets[1:-1] - 1] = False
+        keys = keys[keep]
+        pair_offsets = offsets - np.arange(len(offsets))
+        return keys, ~self._in_model(keys), pair_offsets
+
+    def score(self, traces):
+        """Replay traces on the model and return per-case results.
+
+        Parameters
+        ----------
+        traces: dict / list / Log
+            Cases to check: a dictionary where the key is a case id
+            and the value is a sequence of events, a list of event
+            sequences, or a Log object
+
+        Returns
+        =======
+        dict: with the following arrays (one value per case)
+            'loss': losses of transitions absent in the model and
+            of transitions from 'start' and to 'end' (see Graph.fitness)
+            'deviations': number of transitions absent in the model
+            'steps': number of transitions, including 'start' and 'end'
+            and 'cases': case ids (if case ids are passed)
+        """
+        cases = None
+        if hasattr(traces, 'flat_log'):
+            traces = traces.flat_log
+        if isinstance(traces, Mapping):
+            cases = list(traces)
+            traces = list(traces.values())
+        elif not isinstance(traces, (list, tuple)):
+            traces = list(traces)
+        scores = self._score(*self.replay(traces))
+        if cases is not None:
+            scores['cases'] = cases
+        return scores
+
+    def score_codes(self, codes, offsets, labels):
+        """Replay traces encoded by another codebook (see encode_codes)
+        and return per-case results (see score)."""
+        return self._score(*self._replay(*self.encode_codes(codes, offsets,
+                                                            labels)))
+
+    def _score(self, keys, deviating, offsets):
+        """Return per-case results of replay (see score)."""
+        # Transitions from 'start' and to 'end' are always charged
+        charged = deviating.copy()
+        charged[offsets[:-1]] = True
+        charged[offsets[1:] - 1] = True
+        losses = np.where(charged, self._lookup(keys), 0.)
+        csum = np.concatenate(([0.], np.cumsum(losses)))
+        dsum = np.concatenate(([0], np.cumsum(deviating)))
+        scores = {'loss': csum[offsets[1:]] - csum[offsets[:-1]],
+                  'deviations': dsum[offsets[1:]] - dsum[offsets[:-1]],
+                  'steps': np.diff(offsets)}
+        return scores
+
+    def missing_transitions(self, trace):
+        """Return transitions of a trace that are absent in the model."""
+        trace = ['start'] + list(trace) + ['end']
+        return [(a_i, a_j) for a_i, a_j in zip(trace, trace[1:])
+                if (a_i, a_j) not in self.edges]
+
+    def fitness(self, log):
+        """Return the value of a cost function that includes only
+        loss term (see Graph.fitness).
+        """
+        return float(self.score(log)['loss'].sum()) + self._model_loss
+
+def _restore(state):
+    """Unpickle CompiledModel."""
+    model = CompiledModel.__new__(CompiledModel)
+    for name, value in zip(CompiledModel.__slots__, state):
+        if name == '_index':
+            value = types.MappingProxyType(value)
+        elif isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        object.__setattr__(model, name, value)
+    return model
+
+def compile_model(edges, log, T):
+    """Return a model compiled for batch conformance checking
+    (see CompiledModel).
+
+    Parameters
+    ----------
+    edges: dict / list
+        Edges of the process model
+    log: Log
+        Ordered records of events the model is discovered from
+    T: dict
+        Transition matrix of the log
+    """
+    T = transit_matrix(log, T)
+    return CompiledModel(edges, T, len(log.cases))
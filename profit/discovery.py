@@ -0,0 +1,118 @@
+"""Pure functional entry point of process model discovery.
+
+discover never mutates its arguments: the transition matrix and the
+graph are private to the call (a passed transition matrix is copied,
+as discovery adds 'start' and 'end' nodes to it, see transit_matrix),
+and the log is only read. Hence many discoveries may run concurrently
+in a thread pool over one shared log.
+
+Examples
+--------
+>>> from concurrent.futures import ThreadPoolExecutor
+>>> with ThreadPoolExecutor(8) as executor:
+...     models = list(executor.map(
+...         lambda p: discover(log, {'activities': 80, 'paths': p},
+...                            {'optimize': False}),
+...         range(0, 101, 10)))
+"""
+from transition_matrix import TransitionMatrix
+from graph import Graph
+from cache import DiscoveryCache
+
+# Discovery parameters and their default values (ProcessMap extends
+# them with the parameters of workers and rendering)
+PARAMS = {'optimize': True,
+          'lambd': 0.5,
+          'step': 10,
+          'verbose': False,
+          'cache': None,
+          'max_seconds': None,
+          'max_evals': None,
+          'callback': None,
+          'cancel': None,
+          'aggregate': False,
+          'agg_type': 'outer',
+          'heuristic': 'all',
+          'pre_traverse': False,
+          'ordered': False,
+          'cycle_rel': 0.5,
+          'joint': False,
+          'cycle_rels': [i / 10 for i in range(1, 11)],
+          'executor': None}
+
+def _transition_matrix(log, T=None):
+    """Return a private transition matrix of the log or a copy of T."""
+    TM = TransitionMatrix()
+    if T is not None:
+        T = T if type(T) == dict else T.T
+        # Frequencies are tuples, so copying the rows is enough
+        TM.T = {a_i: dict(row) for a_i, row in T.items()}
+    elif log.codes is None:
+        TM.update(log.flat_log)
+    else:
+        TM.update_encoded(log)
+    return TM
+
+def discover(log, rates=None, params=None, T=None):
+    """Discover process model from the log without mutating the
+    arguments. Return the model as an immutable Model with the rates
+    it is discovered with (optimal rates, if optimize is True).
+
+    Parameters
+    ----------
+    log: Log
+        Ordered records of events (or its filtered view)
+    rates: dict
+        Activities and paths rates (default None, i.e.
+        {'activities': 100, 'paths': 0})
+    params: dict
+        Discovery parameters (see PARAMS and ProcessMap); parameters
+        of rendering are not accepted (default None)
+    T: TransitionMatrix / dict
+        Transition matrix of the log to reuse (default None, i.e.
+        it is computed from the log)
+
+    Returns
+    =======
+    Model: process model (see Graph.freeze); with joint optimization,
+        its rates are activities and paths rates and cycle_rel
+
+    See Also
+    ---------
+    ProcessMap.update
+    Model
+    """
+    unknown = [p for p in (params or {}) if p not in PARAMS]
+    if unknown:
+        raise ValueError('No such parameters: {}'.format(unknown))
+    p = dict(PARAMS, **(params or {}))
+    rates = dict(rates or {'activities': 100, 'paths': 0})
+    for name in ['activities', 'paths']:
+        if (rates[name] < 0) | (rates[name] > 100):
+            raise ValueError('{} rate is out of range'.format(name.capitalize()))
+    TM = _transition_matrix(log, T)
+    G = Graph()
+    joint = p['optimize'] & p['aggregate'] & p['joint']
+
+    if joint:
+        rates = G.optimize_joint(log, TM, p['lambd'], p['step'],
+                                 p['cycle_rels'], p['agg_type'],
+                                 p['heuristic'], p['pre_traverse'],
+                                 p['ordered'], p['executor'], p['verbose'])
+    elif p['optimize']:
+        cache = p['cache']
+        if isinstance(cache, str):
+            cache = DiscoveryCache(cache)
+        rates = G.optimize(log, TM, p['lambd'], p['step'], p['verbose'],
+                           cache, p['max_seconds'], p['max_evals'],
+                           p['callback'], p['cancel'])
+    else:
+        G.update(log, rates['activities'], rates['paths'], TM)
+    if p['aggregate'] & (not joint):
+        G.aggregate(log, rates['activities'], rates['paths'], p['agg_type'],
+                    p['heuristic'], p['pre_traverse'], p['ordered'],
+                    p['cycle_rel'])
+    if joint:
+        return G.freeze((rates['activities'], rates['paths'],
+                         rates['cycle_rel']))
+    return G.freeze((rates['activities'], rates['paths']))
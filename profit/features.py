@@ -0,0 +1,108 @@
+import numpy as np
+from conformance import compile_model
+from util_agg import reconstruct_log
+
+def _case_index(offsets):
+    """Return case index of every element of a flat array split
+    by offsets."""
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def case_features(log, G, T, meta_states=None, ordered=False, sparse=True):
+    """Return a case-feature matrix for all cases in the log.
+
+    The features are
+    1. transition counts: how many times each transition observed
+       in the log (including ones from 'start' and to 'end') occurs
+       in a case;
+    2. meta state occurrences: how many times each meta state occurs
+       in a case of the log rebuilt according to meta states (see
+       reconstruct_log);
+    3. conformance: losses and number of transitions absent in the
+       model, and a flag whether the case fits the model completely
+       (see CompiledModel.score).
+
+    Parameters
+    ----------
+    log: Log
+        Ordered records of events
+    G: Graph / Model
+        Process model discovered from the log
+    T: TransitionMatrix
+        A matrix describing the transitions of a Markov chain
+    meta_states: list
+        Meta states to count (default None, i.e. meta states
+        of the model)
+    ordered: bool
+        If True, the order of meta state activities is fixed
+        strictly (default False)
+    sparse: bool
+        If True, return scipy.sparse CSR matrix, else
+        numpy.ndarray (default True)
+
+    Returns
+    =======
+    tuple: feature matrix (cases by rows), list of feature names
+        and list of case ids (in the order of rows)
+
+    See Also
+    ---------
+    CompiledModel
+    reconstruct_log
+    """
+    cases = list(log.flat_log)
+    traces = list(log.flat_log.values())
+    n = len(cases)
+    model = compile_model(G.edges, log, T.T)
+    names, rows, cols, vals = [], [], [], []
+
+    # 1. Transition counts
+    keys, deviating, offsets = model.replay(traces)
+    case_idx = _case_index(offsets)
+    uniq, col = np.unique(keys, return_inverse=True)
+    size = len(model.activities) + 1
+    names += [('transition', (model.activities[k // size],
+                              model.activities[k % size])) for k in uniq]
+    rows.append(case_idx)
+    cols.append(col.ravel())
+    vals.append(np.ones(len(col)))
+
+    # 2. Meta state occurrences
+    if meta_states is None:
+        meta_states = [v for v in G.nodes if type(v) == tuple]
+    meta_states = list(meta_states)
+    if meta_states:
+        states_ind = {s: i for i, s in enumerate(meta_states)}
+        log_agg = reconstruct_log(log, meta_states[:], ordered)
+        lengths = np.fromiter((len(log_agg[c]) for c in cases),
+                              dtype=np.int64, count=n)
+        state = np.fromiter((states_ind.get(e, -1) for c in cases
+                             for e in log_agg[c]),
+                            dtype=np.int64, count=lengths.sum())
+        state_case = np.repeat(np.arange(n), lengths)
+        mask = state >= 0
+        names += [('meta_state', s) for s in meta_states]
+        rows.append(state_case[mask])
+        cols.append(state[mask] + len(uniq))
+        vals.append(np.ones(mask.sum()))
+
+    # 3. Conformance (from the same replay as transition counts)
+    scores = model._score(keys, deviating, offsets)
+    shift = len(names)
+    names += [('conformance', 'loss'), ('conformance', 'deviations'),
+              ('conformance', 'fits')]
+    for i, v in enumerate([scores['loss'], scores['deviations'],
+                           scores['deviations'] == 0]):
+        rows.append(np.arange(n))
+        cols.append(np.full(n, shift + i))
+        vals.append(v.astype(float))
+
+    rows, cols, vals = (np.concatenate(x) for x in (rows, cols, vals))
+    if sparse:
+        from scipy.sparse import coo_matrix
+        # Duplicate entries are summed on conversion
+        X = coo_matrix((vals, (rows, cols)), shape=(n, len(names))).tocsr()
+    else:
+        m = len(names)
+        X = np.bincount(rows * m + cols, weights=vals,
+                        minlength=n * m).reshape(n, m)
+    return X, names, cases
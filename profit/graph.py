@@ -3,18 +3,30 @@ from transition_matrix import TransitionMatrix
 from observer_abc import Observer
 from util_pm import *
 from util_agg import *
+from conformance import compile_model
+from model import Model
 import sys
 import math
+import time
+import bisect
 
 class Graph(Observer):
     """Class to represent process model as a graph structure."""
 
     def __init__(self):
         """Graph object as a set of nodes (default None) and 
-        a set of edges (default None).
+        a set of edges (default None). Results of the last
+        optimization are kept in evaluations, and its status is
+        kept in optimization (see optimize).
         """
         self.nodes = None
         self.edges = None
+        self._codebook = ()
+        self.evaluations = dict()
+        self.optimization = dict()
+        self._scale = None
+        self._models = dict()
+        self._prepared = None
 
     def update(self, log, activity_rate, path_rate, T, S_node=None):
         """Update nodes and edges attributes performing node
@@ -52,12 +64,28 @@ class Graph(Observer):
                (pp. 328-343). Springer, Berlin, Heidelberg.
         """
         # 1. Node filtering
-        S = S_node if S_node else node_significance(log)
-        S_norm = dict_normalization(S, nested=False)
-        activities = [a for a in S_norm if S_norm[a] >= (1 - activity_rate / 100)]
+        S, S_norm, activities = self._filter_nodes(log, activity_rate, S_node)
         
         # 2. Edge filtering
         T = T if type(T)==dict else transit_matrix(log, T.T)
+        E = self._edge_significance(log, activities, T)
+        transitions = self._filter_edges(E, activities, path_rate)
+        
+        # 3. Check graph connectivity
+        self._connect(log, activities, transitions, T, S, S_norm, E)
+
+    def _filter_nodes(self, log, activity_rate, S_node=None):
+        """Return node significance, normalized node significance
+        and activities preserved with the activity rate."""
+        S = S_node if S_node else node_significance(log)
+        S_norm = dict_normalization(S, nested=False)
+        activities = [a for a in S_norm if S_norm[a] >= (1 - activity_rate / 100)]
+        return S, S_norm, activities
+
+    def _edge_significance(self, log, activities, T):
+        """Return normalized significance of outcoming, incoming and
+        self-loop edges, and relative significance of conflicting
+        relations between the activities."""
         # Significance matrix of outcoming edges
         S_out = edge_sig(T, source=activities+['start'], \
                             target=activities+['end'], type_='out')
@@ -65,31 +93,98 @@ class Graph(Observer):
         S_in = edge_sig(T, source=activities+['end'], \
                            target=activities+['start'], type_='in')
         # Self-loops case significance
-        S_loop = {a_i: T[a_i][a_j][1] / len(log.cases) for a_i in T \
-                  for a_j in T[a_i] if (a_i == a_j) & (a_i in activities)}
+        activities_set = set(activities)
+        S_loop = {a_i: T[a_i][a_i][1] / len(log.cases) for a_i in T \
+                  if (a_i in T[a_i]) & (a_i in activities_set)}
         # Evaluate the relative significance of conflicting relations
         rS = rel_sig(S_out, S_in)
         # Normalization
-        S_out_norm = dict_normalization(S_out, nested=True)
-        S_in_norm = dict_normalization(S_in, nested=True)
-        S_loop_norm = dict_normalization(S_loop)
+        return {'T': T, 'rS': rS,
+                'out': dict_normalization(S_out, nested=True),
+                'in': dict_normalization(S_in, nested=True),
+                'loop': dict_normalization(S_loop)}
+
+    def _filter_edges(self, E, activities, path_rate):
+        """Return transitions preserved with the path rate."""
+        T = E['T']
         # Early algorithm stop
         if path_rate == 100:
-            transitions = [(a_i, a_j) for a_i in T for a_j in T[a_i] \
-                           if (a_i in activities + ['start', 'end']) \
-                           & (a_j in activities + ['start', 'end'])]
+            nodes = set(activities) | {'start', 'end'}
+            transitions = [(a_i, a_j) for a_i in T if a_i in nodes \
+                           for a_j in T[a_i] if a_j in nodes]
         else:
             co = 1 - path_rate / 100 # cut-off threshold
-            transitions = list(conflict_resolution(rS)) # initial set of transitions to preserve    
-            transitions = edge_filtering(S_in_norm, transitions, co=co, type_='in')
-            transitions = edge_filtering(S_out_norm, transitions, co=co, type_='out')
-            for a_i in S_loop_norm:
-                if (S_loop_norm[a_i] - 0.01 >= co) | (co == 0):
+            transitions = list(conflict_resolution(E['rS'])) # initial set of transitions to preserve    
+            transitions = edge_filtering(E['in'], transitions, co=co, type_='in')
+            transitions = edge_filtering(E['out'], transitions, co=co, type_='out')
+            for a_i in E['loop']:
+                if (E['loop'][a_i] - 0.01 >= co) | (co == 0):
                     transitions.append((a_i, a_i))
-        
-        # 3. Check graph connectivity
+        return transitions
+
+    def prepare(self, log, activity_rate, T, S_node=None):
+        """Perform node filtering with the activity rate and compute
+        the path rate at which every candidate edge is preserved, so
+        that update_paths performs edge filtering as a threshold query.
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events
+        activity_rate: float
+            The inverse value to node significance threshold
+        T: TransitionMatrix / dict
+            A matrix describing the transitions of a Markov chain
+        S_node: dict
+            Node significance (default None)
+
+        See Also
+        ---------
+        update
+        update_paths
+        """
+        S, S_norm, activities = self._filter_nodes(log, activity_rate, S_node)
+        T = T if type(T)==dict else transit_matrix(log, T.T)
+        E = self._edge_significance(log, activities, T)
+        admission = self._edge_admission(E)
+        edges = sorted(admission, key=admission.get, reverse=True)
+        self._prepared = {'log': log, 'activity_rate': activity_rate,
+                          'T': T, 'S': S, 'S_norm': S_norm,
+                          'activities': activities, 'E': E,
+                          'edges': edges,
+                          'thresholds': [-admission[e] for e in edges],
+                          'all_edges': self._filter_edges(E, activities, 100)}
+
+    def update_paths(self, path_rate):
+        """Update nodes and edges attributes for another path rate
+        and the activity rate passed to prepare: the edges whose
+        significance clears the cut-off threshold are selected in the
+        sorted array of thresholds and then the graph connectivity is
+        checked (see update).
+        """
+        if self._prepared is None:
+            raise ValueError('No prepared activities, call prepare first')
+        P = self._prepared
+        i = self._admitted(path_rate)
+        transitions = P['all_edges'][:] if i is None else P['edges'][:i]
+        self._connect(P['log'], P['activities'], transitions, P['T'],
+                      P['S'], P['S_norm'], P['E'])
+
+    def _admitted(self, path_rate):
+        """Return the number of the prepared edges whose significance
+        clears the cut-off threshold of the path rate (None, if all the
+        candidate edges are preserved). Edges with equal thresholds are
+        admitted together, so the number defines the set of edges."""
+        if path_rate == 100:
+            return None
+        co = 1 - path_rate / 100 # cut-off threshold
+        return bisect.bisect_right(self._prepared['thresholds'], -co)
+
+    def _connect(self, log, activities, transitions, T, S, S_norm, E):
+        """Make the graph of activities and transitions connected
+        and update nodes and edges attributes."""
         I = incidence_matrix(transitions) # Filtered incidence matrix
-        check_feasibility(activities, transitions, T, I, S_norm, S_out_norm)
+        check_feasibility(activities, transitions, T, I, S_norm, E['out'])
         
         activitiesDict = {a: (sum([v[0] for v in T[a].values()]),
                               int(S[a] * len(log.cases))) for a in activities}
@@ -101,7 +196,62 @@ class Graph(Observer):
         self.nodes = activitiesDict
         self.edges = transitionsDict
 
-    def optimize(self, log, T, lambd, step, verbose=False):
+    def rate_breakpoints(self, log, T):
+        """Return pairs of activities and paths rates at which the
+        process model may change: activity rates at the distinct
+        values of normalized node significance and, for every such
+        activity rate, path rates at the distinct values of normalized
+        edge significance. Every model that update can produce is
+        produced by one of these pairs.
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events
+        T: TransitionMatrix
+            A matrix describing the transitions of a Markov chain
+        """
+        T = transit_matrix(log, T.T)
+        S_norm = dict_normalization(node_significance(log), nested=False)
+        rates = []
+        for a in rate_breakpoints(S_norm.values()):
+            activities = [x for x in S_norm if S_norm[x] >= (1 - a / 100)]
+            E = self._edge_significance(log, activities, T)
+            values = self._edge_admission(E).values()
+            rates += [(a, p) for p in rate_breakpoints(values)]
+        return rates
+
+    def _edge_admission(self, E):
+        """Return the significance with which every candidate edge
+        clears the cut-off threshold of edge filtering (see update):
+        an edge is preserved with a path rate, if its value is not
+        less than 1 - path_rate / 100 (infinity means that the edge
+        is preserved with any path rate less than 100).
+        """
+        inf = float('inf')
+        admission = dict()
+
+        def admit(e, v):
+            if (e not in admission) or (admission[e] < v):
+                admission[e] = v
+
+        for e in conflict_resolution(E['rS']):
+            admit(e, inf)
+        for type_ in ['in', 'out']:
+            S = E[type_]
+            for a in S:
+                # The most significant edge is preserved anyway
+                first = max(S[a], key=S[a].get)
+                for b in S[a]:
+                    e = (b, a) if type_ == 'in' else (a, b)
+                    admit(e, inf if b == first else S[a][b])
+        for a in E['loop']:
+            admit((a, a), E['loop'][a] - 0.01)
+        return admission
+
+    def optimize(self, log, T, lambd, step, verbose=False, cache=None,
+                 max_seconds=None, max_evals=None, callback=None, cancel=None,
+                 backend=None):
         """Find optimal rates for the process model in terms of
         completeness and comprehension via quality function
         optimization.
@@ -115,18 +265,80 @@ class Graph(Observer):
         lambd: float
             Regularization term coefficient: the more it is, the
             more penalty for the model complexity is
-        step: int / float / list
-            Step value or list of grid points for the search space
+        step: int / float / list / str
+            Step value or list of grid points for the search space.
+            If 'exact', the rates at which the model changes are
+            searched (see rate_breakpoints), so that the optimum is
+            exact. Every distinct model is evaluated then, which
+            usually takes longer than a grid search (even with step 2)
+        cache: DiscoveryCache
+            On-disk cache of optimization results: if the log was
+            already optimized with the same lambd and step, the result
+            is returned without search (default None)
+        max_seconds: float
+            Time budget of the search in seconds (default None, i.e.
+            not limited)
+        max_evals: int
+            Maximum number of distinct models to evaluate (default
+            None, i.e. not limited)
+        callback: callable
+            Function called after every grid point with a dictionary
+            of progress: the number of points done and total, the
+            number of evaluated models and elapsed time (default None)
+        cancel: threading.Event
+            Object with is_set method: if it is set, the search is
+            stopped (default None)
+        backend: ParallelBackend
+            Backend to compute node significance and losses of the
+            models in parallel (default None)
 
         Returns
         =======
         dict: optimal activities and paths rates
 
+        Notes
+        -----
+        Models with the same set of edges are evaluated once.
+        Losses and complexity of the evaluated models do not depend on
+        lambd. They are kept in the evaluations attribute as a dictionary
+        with (activity rate, path rate) as a key and a tuple of losses,
+        complexity, number of nodes and number of edges as a value,
+        and the models that may be optimal for some lambd are kept
+        too. So the trade-off (see pareto_front) is available and the
+        model can be re-optimized for another lambd (see reoptimize)
+        without new updates.
+
+        The search is anytime: the models with rates (0, 0) and
+        (100, 100) that define the scale of the quality function are
+        evaluated first, and if the budget is exhausted or the search
+        is cancelled, the best model among the evaluated ones is
+        returned. The status is kept in the optimization attribute:
+        whether the search is finished, the numbers of points done
+        and total, the number of evaluated models and elapsed time.
+        Unfinished results are not cached.
+
         See Also
         ---------
         Log
         TransitionMatrix
+        DiscoveryCache
         """
+        if cache is not None:
+            key = cache.key(log, method='optimize', lambd=lambd, step=step)
+            result = cache.get(key)
+            if result is not None:
+                n = len(result['evaluations'])
+                self.optimization = {'finished': True, 'points': n,
+                                     'total': n, 'evaluations': 0,
+                                     'elapsed': 0, 'cached': True}
+                transit_matrix(log, T.T) # as it is done by update
+                self._prepared = None # nodes and edges are not prepared here
+                self.evaluations = result['evaluations']
+                self._scale = result['scale']
+                self._models = result['models']
+                self.nodes, self.edges = result['nodes'], result['edges']
+                return dict(result['rates'])
+
         transitions_cnt = len([1 for i in log.flat_log
                                  for j in log.flat_log[i]]) \
                           + len(log.flat_log.keys())
@@ -134,51 +346,220 @@ class Graph(Observer):
         N = len(log.activities)
         M = len([1 for a in T.T for b in T.T[a] if (a != 'start') & (b != 'end')])
 
+        evaluated = dict() # evaluations of distinct sets of edges
+        connected = dict() # models of distinct admitted activities and edges
+        S_node = backend.node_significance() if backend is not None else None
+
         def Q(theta1, theta2, lambd):
             """Quality (cost) function (losses + regularization term).
             The losses are defined by fitness function (see fitness) 
             and the regularization term is the average degree of a 
             directed graph.
             """
-            self.update(log, theta1, theta2, T)
+            if (self._prepared is None) or \
+               (self._prepared['activity_rate'] != theta1):
+                self.prepare(log, theta1, T, S_node)
+            # Rates admitting the same activities and edges give the same
+            # model, so its connectivity is checked once
+            admitted = (frozenset(self._prepared['activities']),
+                        self._admitted(theta2))
+            if admitted in connected:
+                self.nodes, self.edges = connected[admitted]
+            else:
+                self.update_paths(theta2)
+                connected[admitted] = (self.nodes, self.edges)
+            key = frozenset(self.edges)
+            if key in evaluated:
+                return evaluated[key]
             n, m = len(self.nodes)+2, len(self.edges)
-            losses = self.fitness(log, T.T, ADS)
+            if backend is None:
+                losses = self.fitness(log, T.T, ADS)
+            else:
+                losses = backend.fitness(self.edges, T.T)
             # Calculate average degree
             compl = m / n
+            evaluated[key] = (losses, compl, n - 2, m)
             
-            return losses, compl
+            return evaluated[key]
         
-        Q_val = dict() 
-        per_done = 0
-        if type(step) in [int, float]:
-            per_step = 100 / (100 // step + 1) ** 2
-            grid = range(0, 101, step)
-        else: 
-            per_step = 100 / len(step)
-            grid = step
-
-        for a in grid:
-            for p in grid:
-                Q_val[(a,p)] = Q(a, p, lambd)
-                if not verbose: continue
-                per_done += per_step
-                sys.stdout.write("\rOptimization ..... {0:.2f}%".\
-                                                format(per_done))
-                sys.stdout.flush()
+        self.evaluations, self._models = dict(), dict()
+        self._prepared = None
+        t_start = time.perf_counter()
+        if step == 'exact':
+            thetas = self.rate_breakpoints(log, T)
+        else:
+            grid = range(0, 101, step) if type(step) in [int, float] else step
+            thetas = [(a, p) for a in grid for p in grid]
+        status = {'finished': False, 'points': 0, 'total': len(thetas),
+                  'evaluations': 0, 'elapsed': 0, 'cached': False}
+
+        def evaluate(a, p):
+            self.evaluations[(a,p)] = Q(a, p, lambd)
+            self._models[(a,p)] = (self.nodes, self.edges)
+
+        def stopped():
+            if (cancel is not None) and cancel.is_set():
+                return True
+            if (max_seconds is not None) and \
+               (time.perf_counter() - t_start >= max_seconds):
+                return True
+            return (max_evals is not None) and (len(evaluated) >= max_evals)
+
+        # The models defining the scale are evaluated first
         max_loss = Q(0, 0, lambd)[0]
+        anchors = [theta for theta in [(0, 0), (100, 100)] if theta in thetas]
+        for a, p in anchors:
+            evaluate(a, p)
         max_compl = Q(100, 100, lambd)[1]
+        self._scale = (max_loss, max_compl)
+
+        for i, (a, p) in enumerate(thetas):
+            if (a, p) not in self.evaluations:
+                if self.evaluations and stopped(): break
+                evaluate(a, p)
+            status['points'] = i + 1
+            status['finished'] = status['points'] == len(thetas)
+            if callback is not None:
+                status['evaluations'] = len(evaluated)
+                status['elapsed'] = time.perf_counter() - t_start
+                callback(dict(status))
+            if not verbose: continue
+            sys.stdout.write("\rOptimization ..... {0:.2f}%".\
+                                            format(100 * (i + 1) / len(thetas)))
+            sys.stdout.flush()
+        status['evaluations'] = len(evaluated)
+        status['elapsed'] = time.perf_counter() - t_start
+        self.optimization = status
+        # Keep the order of the grid points (ties are resolved by it)
+        self.evaluations = {theta: self.evaluations[theta] for theta in thetas
+                            if theta in self.evaluations}
+        # Only weakly non-dominated models may be optimal for some lambd
+        front = pareto_front(self.evaluations, strict=False)
+        self._models = {theta: self._models[theta] for theta in front}
+        rates = self.reoptimize(lambd)
+        if (cache is not None) & status['finished']:
+            cache.set(key, {'rates': rates, 'nodes': self.nodes,
+                            'edges': self.edges, 'scale': self._scale,
+                            'evaluations': self.evaluations,
+                            'models': self._models})
+
+        return rates
+
+    def reoptimize(self, lambd):
+        """Choose optimal rates for another regularization term
+        coefficient among the models evaluated by the last optimization
+        (see optimize). Return optimal activities and paths rates.
+        """
+        if not self.evaluations:
+            raise ValueError('No evaluated models, call optimize first')
+        max_loss, max_compl = self._scale
+        Q_val = {theta: (1 - lambd) * v[0] / max_loss + lambd * v[1] / max_compl
+                 for theta, v in self.evaluations.items()}
+        Q_opt = min(Q_val, key=lambda theta: Q_val[theta])
+        self.nodes, self.edges = self._models[Q_opt]
+
+        return {'activities': Q_opt[0], 'paths': Q_opt[1]}
+
+    def pareto_front(self):
+        """Return trade-off between losses and complexity of the
+        models evaluated by the last optimization (see optimize): a list
+        of non-dominated models ordered by losses, where every model is
+        a dictionary with its rates, losses, complexity (average degree)
+        and size.
+        """
+        return [{'activities': theta[0], 'paths': theta[1],
+                 'loss': v[0], 'complexity': v[1], 'nodes': v[2], 'edges': v[3]}
+                for theta, v in pareto_front(self.evaluations).items()]
+
+    def optimize_joint(self, log, T, lambd, step, cycle_rels, agg_type='outer',
+                       heuristic='all', pre_traverse=False, ordered=False,
+                       executor=None, verbose=False):
+        """Find optimal activities and paths rates together with the
+        significance level for meta states (see aggregate) via the
+        quality function optimization (see optimize).
+
+        For every pair of rates, cycles are searched once, and models
+        with the same meta states are evaluated once. The log rebuilt
+        according to meta states is shared between all pairs of rates
+        (within a task, if executor is used).
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events
+        T: TransitionMatrix
+            A matrix describing the transitions of a Markov chain
+        lambd: float
+            Regularization term coefficient: the more it is, the
+            more penalty for the model complexity is
+        step: int / float / list
+            Step value or list of grid points for the rates
+        cycle_rels: list
+            Grid points of significance levels for meta states
+        agg_type: str
+            Type of aggregation (default 'outer')
+        heuristic: str
+            Heuristic for edges redirecting (default 'all')
+        pre_traverse: bool
+            If True, performs graph traversal from 'start' node to define
+            the order of activities in the cycles (default False)
+        ordered: bool
+            If True, the order of cycle activities is fixed strictly
+            (default False)
+        executor: Executor
+            Executor (e.g., concurrent.futures.ProcessPoolExecutor)
+            to evaluate activity rates in parallel (default None)
+
+        Returns
+        =======
+        dict: optimal activities and paths rates and cycle_rel
+
+        See Also
+        ---------
+        optimize
+        aggregate
+        """
+        grid = range(0, 101, step) if type(step) in [int, float] else step
+        transit_matrix(log, T.T) # to share T between tasks as read-only
+        ADS = ADS_matrix(log, T.T)
+        args = (log, T, ADS, grid, cycle_rels, agg_type, heuristic,
+                pre_traverse, ordered)
+        Q_val = dict()
+        if executor is None:
+            reconstructed = dict()
+            tasks = (_evaluate_joint(a, *args, reconstructed=reconstructed)
+                     for a in grid)
+        else:
+            futures = [executor.submit(_evaluate_joint, a, *args) for a in grid]
+            tasks = (f.result() for f in futures)
+        for i, Q_a in enumerate(tasks):
+            Q_val.update(Q_a)
+            if not verbose: continue
+            sys.stdout.write("\rOptimization ..... {0:.2f}%".\
+                                format(100 * (i + 1) / len(grid)))
+            sys.stdout.flush()
+
+        self.update(log, 0, 0, T)
+        max_loss = self.fitness(log, T.T, ADS)
+        self.update(log, 100, 100, T)
+        max_compl = len(self.edges) / (len(self.nodes) + 2)
         for theta in Q_val:
             Q_val[theta] = (1 - lambd) * Q_val[theta][0] / max_loss + \
                            lambd * Q_val[theta][1] / max_compl
-        Q_opt = min(Q_val, key=lambda theta: Q_val[theta])
-        self.update(log, Q_opt[0], Q_opt[1], T)
+        a, p, cycle_rel = min(Q_val, key=lambda theta: Q_val[theta])
+        self.update(log, a, p, T)
+        self.aggregate(log, a, p, agg_type, heuristic, pre_traverse,
+                       ordered, cycle_rel)
 
-        return {'activities': Q_opt[0], 'paths': Q_opt[1]}
+        return {'activities': a, 'paths': p, 'cycle_rel': cycle_rel}
 
     def aggregate(self, log, activity_rate, path_rate, agg_type='outer',
-                  heuristic='all', pre_traverse=False, ordered=False, cycle_rel=0.5):
+                  heuristic='all', pre_traverse=False, ordered=False, cycle_rel=0.5,
+                  backend=None):
         """Aggregate cycle nodes into meta state, if it is 
-        significant one. Note: the log is not changed.
+        significant one. Note: the log is not changed. Cycles are
+        searched in parallel, if backend (see ParallelBackend) is
+        passed.
 
         See also
         --------
@@ -186,17 +567,33 @@ class Graph(Observer):
         reconstruct_log
         redirect_edges
         """
-        SC = self.find_states(log, pre_traverse, ordered, cycle_rel)
-        log_agg = Log()
-        log_agg.flat_log = reconstruct_log(log, SC, ordered)
-        log_agg.activities = log.activities.union(set(SC))
-        log_agg.cases = log.cases
-        T = TransitionMatrix()
-        T.update(log_agg.flat_log)
+        SC = self.find_states(log, pre_traverse, ordered, cycle_rel, backend)
+        self.aggregate_states(log, SC, activity_rate, path_rate,
+                              agg_type, heuristic, ordered)
+
+    def aggregate_states(self, log, SC, activity_rate, path_rate,
+                         agg_type='outer', heuristic='all', ordered=False,
+                         reconstructed=None):
+        """Aggregate given meta states SC (see aggregate).
+
+        Parameters
+        ----------
+        reconstructed: tuple
+            Log rebuilt according to the meta states and its
+            transition matrix, if they are already computed
+            (default None)
+        """
         if agg_type not in ['outer', 'inner']:
             raise ValueError('Invalid aggregation type')
         if heuristic not in ['all', 'frequent']:
             raise ValueError('Invalid heuristic')
+        if reconstructed is None:
+            reconstructed = self.reconstruct(log, SC, ordered)
+        SC = sorted(SC, key=len, reverse=True)
+        log_agg = Log()
+        log_agg.flat_log, T = reconstructed
+        log_agg.activities = log.activities.union(set(SC))
+        log_agg.cases = log.cases
         if agg_type == 'inner':
             self.update(log_agg, 100, 0, T)
             nodes = self.nodes
@@ -209,6 +606,80 @@ class Graph(Observer):
         else:
             self.update(log_agg, activity_rate, path_rate, T)
 
+    def reconstruct(self, log, SC, ordered=False):
+        """Return log rebuilt according to meta states SC and
+        its transition matrix (see reconstruct_log).
+        """
+        flat_log = reconstruct_log(log, list(SC), ordered)
+        T = TransitionMatrix()
+        T.update(flat_log)
+        return flat_log, T
+
+    def aggregate_sweep(self, log, activity_rate, path_rate, cycle_rels,
+                        agg_types=('outer',), heuristics=('all',),
+                        pre_traverse=False, ordered=False):
+        """Aggregate the model for every combination of cycle_rel,
+        agg_type and heuristic values. Cycles are searched once, and
+        the rebuilt log and its transition matrix are computed once
+        for every distinct set of meta states. The model itself is
+        not changed.
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events
+        activity_rate: float
+            Activity rate of the aggregated models
+        path_rate: float
+            Path rate of the aggregated models
+        cycle_rels: list
+            Significance levels for meta states
+        agg_types: list
+            Types of aggregation (default ('outer',))
+        heuristics: list
+            Heuristics for edges redirecting (default ('all',))
+        pre_traverse: bool
+            If True, performs graph traversal from 'start' node to define
+            the order of activities in the cycles (default False)
+        ordered: bool
+            If True, the order of cycle activities is fixed strictly
+            (default False)
+
+        Returns
+        =======
+        dict: with (cycle_rel, agg_type, heuristic) as a key and
+            a tuple of nodes and edges of the aggregated model as a value
+
+        See also
+        --------
+        aggregate
+        find_cycles
+        """
+        nodes, edges = self.nodes, self.edges
+        cycles = self.find_cycles(log, pre_traverse, ordered)
+        case_cnt = len(log.cases)
+        reconstructed, models, results = dict(), dict(), dict()
+        try:
+            for cycle_rel in cycle_rels:
+                SC = significant_states(cycles, case_cnt, cycle_rel)
+                key = tuple(sorted(SC, key=len, reverse=True))
+                if key not in reconstructed:
+                    reconstructed[key] = self.reconstruct(log, key, ordered)
+                for agg_type in agg_types:
+                    for heuristic in heuristics:
+                        model_key = (key, agg_type, heuristic)
+                        if model_key not in models:
+                            self.aggregate_states(log, key, activity_rate,
+                                                  path_rate, agg_type,
+                                                  heuristic, ordered,
+                                                  reconstructed[key])
+                            models[model_key] = (self.nodes, self.edges)
+                        results[(cycle_rel, agg_type, heuristic)] = \
+                                                        models[model_key]
+        finally:
+            self.nodes, self.edges = nodes, edges
+        return results
+
     def find_nodes_order(self):
         """Perform traverse of a process model from start node.
         Return list of nodes ordered by their closeness to start.
@@ -250,6 +721,13 @@ class Graph(Observer):
         dict: with cycle (tuple) as a key and its occurrence
             frequency in the log as a value
         """
+        cycles = self.count_cycles(log.flat_log.values())
+        return self.merge_cycles(cycles, pre_traverse, ordered)
+
+    def count_cycles(self, traces):
+        """Return occurrences of cycles in the traces: a dictionary with
+        cycle (tuple) as a key and a list of its absolute and case
+        frequencies as a value (see find_cycles)."""
         def check_edges(bad_edges_inds, s_ind, f_ind):
             for ind in bad_edges_inds:
                 if ind >= f_ind:
@@ -259,7 +737,7 @@ class Graph(Observer):
             return True
 
         cycles = dict()
-        for case_log in log.flat_log.values():
+        for case_log in traces:
             bad_edges = [i for i, e in enumerate(zip(case_log, case_log[1:]))
                          if e not in self.edges]
 
@@ -280,7 +758,11 @@ class Graph(Observer):
                         if cycle not in case_cycles:
                             cycles[cycle][1] += 1
                             case_cycles.add(cycle)
+        return cycles
 
+    def merge_cycles(self, cycles, pre_traverse=False, ordered=False):
+        """Merge occurrences of the rotations of the same cycle, if the
+        order of cycle activities is not fixed (see find_cycles)."""
         if pre_traverse:
             ordered_nodes = self.find_nodes_order()
 
@@ -304,7 +786,8 @@ class Graph(Observer):
 
         return cycles
 
-    def find_states(self, log, pre_traverse=False, ordered=False, cycle_rel=0.5):
+    def find_states(self, log, pre_traverse=False, ordered=False, cycle_rel=0.5,
+                    backend=None):
         """Define meta states, i.e. significant cycles, in the model.
         A cycle found in the model is significant, if it occurs more
         than in cycle_rel of cases in the log.
@@ -320,6 +803,8 @@ class Graph(Observer):
             If True, the order of cycle activities is fixed strictly (default False)
         cycle_rel: float
             Significance level for meta states (default 0.5)
+        backend: ParallelBackend
+            Backend to search cycles in parallel (default None)
         Returns
         =======
         list: of significant cycles (meta states)
@@ -328,19 +813,51 @@ class Graph(Observer):
         --------
         find_cycles
         """
-        cycles = self.find_cycles(log, pre_traverse, ordered)
+        if backend is None:
+            cycles = self.find_cycles(log, pre_traverse, ordered)
+        else:
+            cycles = backend.find_cycles(self, pre_traverse, ordered)
 
-        case_cnt = len(log.cases)
-        return [c for c, (abs_freq, case_freq) in cycles.items()
-                if len(c) > 1 and case_freq / case_cnt >= cycle_rel]
+        return significant_states(cycles, len(log.cases), cycle_rel)
+
+    def freeze(self, rates=None):
+        """Return the current nodes and edges as an immutable compact
+        Model. Models frozen from the graph share the codebook of
+        nodes (see Model).
 
-    def fitness(self, log, T=None, ADS=None):
+        Parameters
+        ----------
+        rates: tuple
+            Activity and path rates to keep in the model (default None)
+        """
+        model = Model(self.nodes, self.edges, self._codebook, rates)
+        self._codebook = model.codebook
+        return model
+
+    def compile(self, log, T, model=None):
+        """Return an immutable model compiled for batch conformance
+        checking of new cases (see CompiledModel).
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events the model is discovered from
+        T: TransitionMatrix
+            A matrix describing the transitions of a Markov chain
+        model: Model
+            Model to compile instead of the current one (default None)
+        """
+        edges = self.edges if model is None else model.edges
+        return compile_model(edges, log, T.T)
+
+    def fitness(self, log, T=None, ADS=None, model=None):
         """Return the value of a cost function that includes
-        only loss term.
+        only loss term. The loss is computed for the current
+        model or for the model passed (see Model).
         """
         if T is None:
             TM = TransitionMatrix()
-            TM.update(log)
+            TM.update(log.flat_log)
             T = TM.T
         if ADS is None:
             ADS = ADS_matrix(log, T)
@@ -367,29 +884,7 @@ class Graph(Observer):
                 loss = eps
             return loss
 
-        edges = self.edges
-        edges1 = []
-        for e in edges:
-            if (type(e[0]) == tuple) & (type(e[1]) == tuple):
-                for e_i in e[0]:
-                    for e_j in e[1]:
-                        edges1.append((e_i,e_j))
-                edges1 += [(e[0][i], e[0][i+1]) for i in range(len(e[0]) - 1)]
-                edges1 += [(e[1][i], e[1][i+1]) for i in range(len(e[1]) - 1)]
-                edges1 += [(e[0][-1], e[0][0]), (e[1][-1], e[1][0])]
-            elif type(e[0]) == tuple:
-                for e_i in e[0]:
-                    edges1.append((e_i,e[1]))
-                edges1 += [(e[0][i], e[0][i+1]) for i in range(len(e[0]) - 1)]
-                edges1 += [(e[0][-1], e[0][0])]
-            elif type(e[1]) == tuple:
-                for e_j in e[1]:
-                    edges1.append((e[0], e_j))
-                edges1 += [(e[1][i], e[1][i+1]) for i in range(len(e[1]) - 1)]
-                edges1 += [(e[1][-1], e[1][0])]
-            else:
-                edges1.append(e)
-        edges1 = set(edges1)
+        edges1 = expand_edges(self.edges if model is None else model.edges)
 
         losses = 0
         for log_trace in log.flat_log.values():
@@ -401,3 +896,36 @@ class Graph(Observer):
         for edge in edges1:
             losses += loss(edge[0], edge[1])
         return losses
+
+def _evaluate_joint(activity_rate, log, T, ADS, path_rates, cycle_rels,
+                    agg_type, heuristic, pre_traverse, ordered,
+                    reconstructed=None):
+    """Return losses and complexity (see Graph.optimize) of the models
+    aggregated with every cycle_rel for the activity rate and every
+    path rate (see Graph.optimize_joint).
+    """
+    G = Graph()
+    case_cnt = len(log.cases)
+    reconstructed = dict() if reconstructed is None else reconstructed
+    Q_val = dict()
+    for path_rate in path_rates:
+        G.update(log, activity_rate, path_rate, T)
+        nodes, edges = G.nodes, G.edges
+        cycles = G.find_cycles(log, pre_traverse, ordered)
+        evaluated = dict()
+        for cycle_rel in cycle_rels:
+            SC = significant_states(cycles, case_cnt, cycle_rel)
+            key = tuple(sorted(SC, key=len, reverse=True))
+            if key not in evaluated:
+                G.nodes, G.edges = nodes, edges
+                if key:
+                    if key not in reconstructed:
+                        reconstructed[key] = G.reconstruct(log, key, ordered)
+                    G.aggregate_states(log, key, activity_rate, path_rate,
+                                       agg_type, heuristic, ordered,
+                                       reconstructed[key])
+                evaluated[key] = (G.fitness(log, T.T, ADS),
+                                  len(G.edges) / (len(G.nodes) + 2))
+            Q_val[(activity_rate, path_rate, cycle_rel)] = evaluated[key]
+    return Q_val
+
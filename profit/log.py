@@ -1,9 +1,38 @@
-import pandas as pd
-import pm4py
+import os
+import numpy as np
+from collections.abc import Mapping
+
+ARROW_FORMATS = ('.parquet', '.pq', '.arrow', '.feather')
+
+def _is_arrow(data):
+    """Check if data is Arrow table (without importing pyarrow)."""
+    return type(data).__module__.split('.')[0] == 'pyarrow'
+
+def _column_names(names, cols):
+    """Return names of the columns given by names or indices."""
+    return [names[c] if type(c) == int else c for c in cols]
+
+def _project(table, cols, filters=None):
+    """Return Arrow table with the columns cols and the rows matching
+    filters."""
+    if filters is not None:
+        import pyarrow.parquet as pq
+        if isinstance(filters, list):
+            filters = pq.filters_to_expression(filters)
+        table = table.filter(filters)
+    return table.select(_column_names(table.column_names, cols))
+
+def _timestamps(col):
+    """Return timestamps as array (in UTC for date strings)."""
+    import pandas as pd
+    if not pd.api.types.is_numeric_dtype(col):
+        # Time zones are converted to UTC to compare timestamps
+        col = pd.to_datetime(col, utc=True).dt.tz_convert(None)
+    return col.to_numpy()
 
 class Log(object):
     """Perform event log object from a log-file.
-    
+
     Attributes
     ----------
     flat_log: dict
@@ -13,7 +42,21 @@ class Log(object):
         Set of cases in the log
     activities: set
         Set of activities in the log
-    
+    codes: ndarray
+        Activity codes of events ordered by case and time, i.e. the
+        traces of flat_log concatenated (default None, i.e. the log
+        was not read via update)
+    offsets: ndarray
+        Offsets of the traces in codes: the events of the i-th case
+        are codes[offsets[i]:offsets[i+1]]
+    labels: list
+        Activities by codes
+    case_ids: list
+        Case ids in the order of traces in codes
+    timestamps: ndarray
+        Timestamps of events in the order of codes (default None,
+        i.e. no timestamp column)
+
     Examples
     --------
     >>> log = Log("../PATH/LOG-FILE.csv", encoding='cp1251')
@@ -23,9 +66,18 @@ class Log(object):
         self.flat_log = dict()
         self.cases = set()
         self.activities = set()
+        self.codes = None
+        self.offsets = None
+        self.labels = None
+        self.case_ids = None
+        self.timestamps = None
+        self._positions = None
+        self._variants = None
 
     def read_xes(self, FILE_PATH):
         """Read XES file into DataFrame."""
+        import pandas as pd
+        import pm4py
         log = pm4py.read_xes(FILE_PATH)
         df = pd.DataFrame([], columns=['ID', 'Activity', 'TimeStamp'])
         trace_id, activity, timestamp  = [], [], []
@@ -37,32 +89,457 @@ class Log(object):
         df['ID'] = trace_id
         df['Activity'] = activity
         df['TimeStamp'] = timestamp
-        df = df.sort_values('TimeStamp').drop('TimeStamp', axis=1)
 
         return df
 
     def update(self, data=None, FILE_PATH='', cols=(0,1), *args, **kwargs):
         """Update attributes via file reading.
-        
+
         Parameters
         ----------
-        data: DataFrame
-            Log-file as DataFrame
+        data: DataFrame / pyarrow.Table
+            Log-file as DataFrame or Arrow table
         FILE_PATH: str
-            Path to the CSV/TXT/XES log-file (alternative to data)
+            Path to the CSV/TXT/XES/Parquet/Arrow log-file or Parquet
+            dataset directory (alternative to data)
         cols: tuple
             Columns in the log-file to use as case id and activity
-            attributes, respectively (default (0,1))
+            attributes, respectively, and optionally timestamp to
+            order the events of a case by (default (0,1), i.e. the
+            order of events in the file is kept). Timestamps are
+            always used for XES files
+        kwargs:
+            Arguments of pandas.read_csv, or filters and arguments of
+            pyarrow.parquet.read_table for Parquet/Arrow data (see
+            read_arrow)
         """
+        import pandas as pd
+        if FILE_PATH.endswith(ARROW_FORMATS) or _is_arrow(data) or \
+           (FILE_PATH and os.path.isdir(FILE_PATH)):
+            return self._update_arrow(data, FILE_PATH, cols, **kwargs)
         if FILE_PATH:
             if FILE_PATH[-4:] == ".xes":
                 log = self.read_xes(FILE_PATH)
             else:
                 log = pd.read_csv(FILE_PATH, usecols=cols, *args, **kwargs)
+                # usecols keeps the order of columns in the file
+                if all(type(c) == int for c in cols):
+                    log = log.iloc[:, [sorted(cols).index(c) for c in cols]]
+                else:
+                    log = log[list(cols)]
         else:
             log = data.iloc[:, list(cols)]
-        log.columns = ['case_id', 'activity']
-        log.set_index('case_id', drop=True, inplace=True)
-        self.flat_log = dict(log.activity.groupby(level=0).agg(tuple))
-        self.cases = set(log.index)
-        self.activities = set(log.activity)
+        timestamps = None
+        if log.shape[1] > 2:
+            timestamps = _timestamps(log.iloc[:, 2])
+        case_ids = log.iloc[:, 0].to_numpy()
+        codes, labels = pd.factorize(log.iloc[:, 1].to_numpy(), sort=True)
+        del log # activities are not kept as objects while traces are built
+        self._encode(case_ids, codes, timestamps, labels.tolist())
+
+    def read_arrow(self, FILE_PATH, cols=(0,1), filters=None, **kwargs):
+        """Read Parquet/Arrow (Feather) file into Arrow table with the
+        case id, activity and (optional) timestamp columns only.
+
+        Parameters
+        ----------
+        FILE_PATH: str
+            Path to the Parquet/Arrow file (or Parquet dataset directory)
+        cols: tuple
+            Names or indices of the case id, activity and (optional)
+            timestamp columns (default (0,1))
+        filters: list / Expression
+            Row filters, e.g. [('department', '=', 'cardio'),
+            ('timestamp', '>=', start)]. For Parquet, they are pushed
+            down, so that row groups not matching them are not read
+            (default None)
+        kwargs:
+            Other arguments of pyarrow.parquet.read_table (or of
+            pyarrow.dataset.Dataset.to_table for Arrow files)
+        """
+        import pyarrow.parquet as pq
+        import pyarrow.dataset as ds
+        if FILE_PATH.endswith(('.arrow', '.feather')):
+            # Only the columns used are read, and filters are pushed down
+            dataset = ds.dataset(FILE_PATH, format='feather')
+            if isinstance(filters, list):
+                filters = pq.filters_to_expression(filters)
+            return dataset.to_table(columns=_column_names(dataset.schema.names,
+                                                          cols),
+                                    filter=filters, **kwargs)
+        # Schema of a file or of a dataset directory
+        schema = ds.dataset(FILE_PATH, format='parquet').schema
+        names = _column_names(schema.names, cols)
+        return pq.read_table(FILE_PATH, columns=names, filters=filters,
+                             read_dictionary=[names[1]], **kwargs)
+
+    def _update_arrow(self, data=None, FILE_PATH='', cols=(0,1),
+                      filters=None, **kwargs):
+        """Update attributes from Parquet/Arrow file or Arrow table.
+        Dictionary-encoded activities are used as activity codes
+        without decoding."""
+        if FILE_PATH:
+            table = self.read_arrow(FILE_PATH, cols, filters, **kwargs)
+        else:
+            table = _project(data, cols, filters)
+        activity = table.column(1)
+        if (activity.num_chunks > 0) and \
+           hasattr(activity.chunk(0), 'dictionary'):
+            table = table.unify_dictionaries()
+            activity = table.column(1)
+            labels = activity.chunk(0).dictionary.to_pylist()
+            codes = np.concatenate([np.asarray(c.indices.fill_null(-1),
+                                               dtype=np.int64)
+                                    for c in activity.chunks])
+            # The dictionary may contain activities removed by filters
+            used = np.unique(codes[codes >= 0])
+            remap = np.full(len(labels) + 1, -1, dtype=np.int64)
+            remap[used] = np.arange(len(used))
+            codes = remap[np.where(codes >= 0, codes, len(labels))]
+            labels = [labels[i] for i in used.tolist()]
+        else:
+            labels, codes = None, activity.to_numpy()
+        timestamps = None
+        if table.num_columns > 2:
+            timestamps = _timestamps(table.column(2).to_pandas())
+        self._encode(table.column(0).to_numpy(), codes, timestamps, labels)
+
+    def _encode(self, case_ids, activities, timestamps=None, labels=None):
+        """Sort events by case and timestamp (stable, i.e. the order
+        of events with equal timestamps is kept) and split them into
+        traces by offsets. If labels are passed, activities are
+        their codes (-1 for missing activities)."""
+        import pandas as pd
+        case_codes, case_ids = pd.factorize(case_ids, sort=True)
+        if labels is None:
+            codes, labels = pd.factorize(activities, sort=True)
+            labels = labels.tolist()
+        else:
+            codes, labels = activities, list(labels)
+        if (codes == -1).any(): # missing activities are kept
+            codes[codes == -1] = len(labels)
+            labels.append(np.nan)
+        # Events with missing case ids are dropped
+        valid = case_codes != -1
+        order = np.flatnonzero(valid)
+        if timestamps is None:
+            order = order[np.argsort(case_codes[valid], kind='stable')]
+            self.timestamps = None
+        else:
+            order = order[np.lexsort((timestamps[valid], case_codes[valid]))]
+            self.timestamps = timestamps[order]
+        self.codes = codes[order]
+        self.offsets = np.zeros(len(case_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(case_codes[valid], minlength=len(case_ids)),
+                  out=self.offsets[1:])
+        self.labels = labels
+        self.case_ids = case_ids.tolist()
+        self._positions, self._variants = None, None
+
+        del case_codes, valid, order
+        # Traces are decoded from slices of codes, so that events are
+        # not materialized as objects beyond the traces themselves
+        decode, codes = labels.__getitem__, self.codes
+        offsets = self.offsets.tolist()
+        self.flat_log = {case: tuple(map(decode,
+                                         codes[offsets[i]:offsets[i+1]].tolist()))
+                         for i, case in enumerate(self.case_ids)}
+        self.cases = set(self.case_ids)
+        self.activities = set(self.labels)
+
+    # Filtering. Filters return lightweight views of the log (see LogView)
+    # that share its traces and codebook.
+
+    def _root(self):
+        """Return the log that stores events."""
+        return self
+
+    def _selection(self):
+        """Return indices of the selected cases (in case_ids of the
+        root log) and the mask of the selected activities (in labels)."""
+        root = self._ensure_encoded()
+        return np.arange(len(root.case_ids)), None
+
+    def _ensure_encoded(self):
+        """Encode flat_log if the log was not read via update."""
+        if self.codes is None:
+            labels = sorted(self.activities, key=str)
+            index = {a: i for i, a in enumerate(labels)}
+            traces = list(self.flat_log.values())
+            lengths = np.fromiter((len(t) for t in traces), dtype=np.int64,
+                                  count=len(traces))
+            self.offsets = np.zeros(len(traces) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=self.offsets[1:])
+            self.codes = np.fromiter((index[a] for t in traces for a in t),
+                                     dtype=np.int64, count=self.offsets[-1])
+            self.labels = labels
+            self.case_ids = list(self.flat_log)
+            self._positions, self._variants = None, None
+        return self
+
+    def filter_cases(self, cases):
+        """Return view of the log with the given cases only, e.g.
+        selected by case attributes in the source table.
+
+        Parameters
+        ----------
+        cases: iterable
+            Case ids to keep (unknown ids are ignored)
+        """
+        root = self._root()._ensure_encoded()
+        sel, mask = self._selection()
+        pos = root._case_positions()
+        keep = np.fromiter((pos[c] for c in cases if c in pos), dtype=np.int64)
+        return LogView(root, np.intersect1d(sel, keep), mask)
+
+    def filter_time(self, start=None, end=None, how='intersecting'):
+        """Return view of the log with the cases in the time range.
+
+        Parameters
+        ----------
+        start, end: str / Timestamp / number
+            Bounds of the time range (default None, i.e. not bounded)
+        how: str
+            'intersecting' to keep the cases with events in the range,
+            'contained' to keep the cases lying in the range entirely,
+            'started' to keep the cases started in the range
+            (default 'intersecting')
+        """
+        root = self._root()._ensure_encoded()
+        if root.timestamps is None:
+            raise ValueError('No timestamps, pass timestamp column in cols')
+        if how not in ['intersecting', 'contained', 'started']:
+            raise ValueError('Invalid type of time filter')
+        sel, mask = self._selection()
+        first = root.timestamps[root.offsets[sel]]
+        last = root.timestamps[root.offsets[sel + 1] - 1]
+        lower = first if how != 'intersecting' else last
+        upper = last if how == 'contained' else first
+        keep = np.ones(len(sel), dtype=bool)
+        if start is not None:
+            keep &= lower >= _time_bound(start, root.timestamps)
+        if end is not None:
+            keep &= upper <= _time_bound(end, root.timestamps)
+        return LogView(root, sel[keep], mask)
+
+    def filter_activities(self, activities):
+        """Return view of the log with the given activities only, i.e.
+        the other events are skipped in the traces, and the cases
+        without the given activities are dropped.
+        """
+        root = self._root()._ensure_encoded()
+        sel, mask = self._selection()
+        activities = set(activities)
+        new_mask = np.array([a in activities for a in root.labels], dtype=bool)
+        if mask is not None:
+            new_mask &= mask
+        counts = np.add.reduceat(new_mask[root.codes].astype(np.int64),
+                                 root.offsets[:-1]) if len(root.codes) \
+                 else np.zeros(len(root.case_ids), dtype=np.int64)
+        counts[np.diff(root.offsets) == 0] = 0
+        return LogView(root, sel[counts[sel] > 0], new_mask)
+
+    def top_variants(self, k):
+        """Return view of the log with the cases of the k most frequent
+        variants (distinct traces)."""
+        root = self._root()._ensure_encoded()
+        sel, mask = self._selection()
+        if mask is None:
+            variants = root._variant_ids()[sel]
+        else:
+            variants = _variants(self.codes, self.offsets)
+        counts = np.bincount(variants) if len(variants) else np.zeros(0)
+        top = np.argsort(-counts, kind='stable')[:k]
+        return LogView(root, sel[np.isin(variants, top)], mask)
+
+    def _case_positions(self):
+        """Return positions of cases in case_ids (cached)."""
+        if self._positions is None:
+            self._positions = {c: i for i, c in enumerate(self.case_ids)}
+        return self._positions
+
+    def _variant_ids(self):
+        """Return variant id of every case in case_ids (cached)."""
+        if self._variants is None:
+            self._variants = _variants(self.codes, self.offsets)
+        return self._variants
+
+def _variants(codes, offsets):
+    """Return variant id of every trace given by codes and offsets:
+    equal traces have equal ids, and ids are numbered in the order of
+    the first occurrence of variants. Traces are compared position by
+    position (prefixes are factorized by hashing), so that the time is
+    linear in the number of events."""
+    import pandas as pd
+    lengths = np.diff(offsets)
+    ids = np.zeros(len(lengths), dtype=np.int64)
+    if not len(lengths):
+        return ids
+    base = int(codes.max()) + 1 if len(codes) else 1
+    # Traces longer than j are the first alive[j] ones in this order
+    order = np.argsort(-lengths, kind='stable')
+    alive = np.searchsorted(-lengths[order], -np.arange(lengths.max()),
+                            side='left')
+    for j, n in enumerate(alive.tolist()):
+        cases = order[:n]
+        # Ids of the prefixes of length j + 1 (equal prefixes, equal ids)
+        keys = ids[cases] * base + codes[offsets[cases] + j]
+        ids[cases] = pd.factorize(keys)[0]
+    # Traces of different lengths may have equal ids of their prefixes
+    return pd.factorize(ids * (lengths.max() + 1) + lengths)[0].astype(np.int64)
+
+def _time_bound(bound, timestamps):
+    """Return time bound comparable with timestamps."""
+    if timestamps.dtype.kind != 'M':
+        return bound
+    import pandas as pd
+    bound = pd.Timestamp(bound)
+    if bound.tz is not None:
+        bound = bound.tz_convert(None)
+    return bound.to_datetime64()
+
+class _TracesView(Mapping):
+    """Read-only dictionary of the selected traces of a log. Traces
+    are taken from the root log (and filtered by activities, if
+    required) on access."""
+
+    def __init__(self, flat_log, cases, activities=None):
+        self._flat_log = flat_log
+        self._cases = cases
+        self._selected = None
+        self._activities = activities
+
+    def _trace(self, case):
+        trace = self._flat_log[case]
+        if self._activities is None:
+            return trace
+        return tuple(a for a in trace if a in self._activities)
+
+    def __getitem__(self, case):
+        if case not in self:
+            raise KeyError(case)
+        return self._trace(case)
+
+    def __iter__(self):
+        return iter(self._cases)
+
+    def __len__(self):
+        return len(self._cases)
+
+    def __contains__(self, case):
+        if self._selected is None:
+            self._selected = set(self._cases)
+        return case in self._selected
+
+    def values(self):
+        return _TracesValues(self)
+
+class _TracesValues(object):
+    """Traces of a view in the order of its cases."""
+
+    def __init__(self, traces):
+        self._traces = traces
+
+    def __iter__(self):
+        return map(self._traces._trace, self._traces._cases)
+
+    def __len__(self):
+        return len(self._traces)
+
+class LogView(Log):
+    """Filtered view of a log (see Log.filter_cases, Log.filter_time,
+    Log.filter_activities, Log.top_variants). A view selects cases
+    and activities by indices and masks over the encoded events of
+    the root log and shares its traces and codebook (labels), so that
+    filtering does not copy the log. A view can be used everywhere a
+    log is used, and it can be filtered further.
+
+    Examples
+    --------
+    >>> view = log.filter_time('2018-01-01', '2018-02-01').top_variants(10)
+    >>> pm.set_log(view)
+    """
+
+    def __init__(self, root, case_idx, mask=None):
+        """Class Constructor."""
+        self._log = root
+        self._case_idx = case_idx
+        self._mask = mask
+        self._cache = dict()
+        case_ids = root.case_ids
+        activities = None
+        if mask is not None:
+            activities = {a for a, m in zip(root.labels, mask) if m}
+        self.flat_log = _TracesView(root.flat_log,
+                                    [case_ids[i] for i in case_idx.tolist()],
+                                    activities)
+
+    def update(self, *args, **kwargs):
+        raise TypeError('Log view is read-only')
+
+    def _root(self):
+        return self._log
+
+    def _selection(self):
+        return self._case_idx, self._mask
+
+    def _ensure_encoded(self):
+        return self
+
+    def _events(self):
+        """Return indices of the selected events in the root log and
+        offsets of the selected traces."""
+        if 'events' not in self._cache:
+            root = self._log
+            starts = root.offsets[self._case_idx]
+            lengths = root.offsets[self._case_idx + 1] - starts
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            events = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1],
+                                                        lengths)
+            if self._mask is not None:
+                keep = self._mask[root.codes[events]]
+                events = events[keep]
+                csum = np.concatenate(([0], np.cumsum(keep)))
+                offsets = csum[offsets]
+            self._cache['events'] = (events, offsets)
+        return self._cache['events']
+
+    @property
+    def codes(self):
+        if 'codes' not in self._cache:
+            self._cache['codes'] = self._log.codes[self._events()[0]]
+        return self._cache['codes']
+
+    @property
+    def offsets(self):
+        return self._events()[1]
+
+    @property
+    def timestamps(self):
+        if self._log.timestamps is None:
+            return None
+        return self._log.timestamps[self._events()[0]]
+
+    @property
+    def labels(self):
+        return self._log.labels
+
+    @property
+    def case_ids(self):
+        if 'case_ids' not in self._cache:
+            self._cache['case_ids'] = list(self.flat_log)
+        return self._cache['case_ids']
+
+    @property
+    def cases(self):
+        if 'cases' not in self._cache:
+            self._cache['cases'] = set(self.flat_log)
+        return self._cache['cases']
+
+    @property
+    def activities(self):
+        if 'activities' not in self._cache:
+            codes = np.unique(self.codes)
+            self._cache['activities'] = {self.labels[c] for c in codes.tolist()}
+        return self._cache['activities']
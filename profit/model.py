@@ -0,0 +1,167 @@
+import numpy as np
+
+class Model(object):
+    """Immutable compact result of process model discovery.
+
+    Nodes and edges are stored as arrays of codes in a codebook of
+    nodes (activities, meta states, 'start' and 'end') and arrays of
+    their absolute and case frequencies. The codebook is a tuple that
+    is shared by the models frozen from the same Graph (see
+    Graph.freeze), so keeping many models (e.g., per rates or per
+    segment of a log) costs only their arrays. Models are hashable,
+    compared by their nodes and edges, and pickled compactly.
+
+    Attributes
+    ----------
+    codebook: tuple
+        Nodes by codes (shared between models)
+    rates: tuple
+        Activity and path rates the model is discovered with, and
+        cycle_rel of joint optimization, if any (default None)
+    nodes: dict
+        Nodes with their frequencies as in Graph.nodes
+    edges: dict
+        Edges with their frequencies as in Graph.edges
+
+    See Also
+    ---------
+    Graph.freeze
+
+    Examples
+    --------
+    >>> models = dict()
+    >>> for p in range(0, 101, 10):
+    ...     G.update(log, 80, p, TM)
+    ...     models[p] = G.freeze(rates=(80, p))
+    >>> pm._Observers['Renderer'].update(TM, models[50])
+    """
+    __slots__ = ('codebook', 'rates', '_node_codes', '_node_freq',
+                 '_node_counts', '_edge_codes', '_edge_freq', '_hash')
+
+    def __init__(self, nodes, edges, codebook=(), rates=None):
+        """Encode nodes and edges of the model.
+
+        Parameters
+        ----------
+        nodes: dict
+            Nodes of the process model (see Graph)
+        edges: dict
+            Edges of the process model (see Graph)
+        codebook: tuple
+            Codebook to reuse; it is extended with new nodes, if
+            required (default empty tuple)
+        rates: tuple
+            Activity and path rates (default None)
+        """
+        nodes, edges = nodes or dict(), edges or dict()
+        index = {v: i for i, v in enumerate(codebook)}
+        new = []
+        for v in list(nodes) + [v for e in edges for v in e]:
+            if v not in index:
+                index[v] = len(index)
+                new.append(v)
+        if new:
+            codebook = tuple(codebook) + tuple(new)
+        # The smallest integer types for codes and frequencies
+        dtype = np.min_scalar_type(len(codebook))
+        freq_max = max([max(freq[:2]) for freq in nodes.values()] +
+                       [max(freq) for freq in edges.values()] + [0])
+        freq_dtype = np.min_scalar_type(freq_max)
+        node_codes = np.fromiter((index[v] for v in nodes), dtype=dtype,
+                                 count=len(nodes))
+        node_freq = np.array([freq[:2] for freq in nodes.values()],
+                             dtype=freq_dtype).reshape(-1, 2)
+        # Activities counts of meta states (see add_frq)
+        node_counts = tuple(tuple(freq[2].items()) if len(freq) > 2 else None
+                            for freq in nodes.values())
+        edge_codes = np.array([(index[e[0]], index[e[1]]) for e in edges],
+                              dtype=dtype).reshape(-1, 2)
+        edge_freq = np.array(list(edges.values()),
+                             dtype=freq_dtype).reshape(-1, 2)
+        for arr in [node_codes, node_freq, edge_codes, edge_freq]:
+            arr.flags.writeable = False
+
+        set_ = object.__setattr__
+        set_(self, 'codebook', codebook)
+        set_(self, 'rates', None if rates is None else tuple(rates))
+        set_(self, '_node_codes', node_codes)
+        set_(self, '_node_freq', node_freq)
+        set_(self, '_node_counts', node_counts)
+        set_(self, '_edge_codes', edge_codes)
+        set_(self, '_edge_freq', edge_freq)
+        set_(self, '_hash', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Model is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Model is immutable')
+
+    def __reduce__(self):
+        # Arrays are pickled as raw bytes to keep small models compact
+        arrays = [self._node_codes, self._node_freq, self._edge_codes,
+                  self._edge_freq]
+        return (_restore, (self.codebook, self.rates, self._node_counts,
+                           self._node_codes.dtype.str,
+                           self._node_freq.dtype.str,
+                           tuple(arr.tobytes() for arr in arrays)))
+
+    @property
+    def nodes(self):
+        nodes = dict()
+        for v, freq, counts in zip(self._node_codes.tolist(),
+                                   self._node_freq.tolist(),
+                                   self._node_counts):
+            if counts is None:
+                nodes[self.codebook[v]] = tuple(freq)
+            else:
+                nodes[self.codebook[v]] = (freq[0], freq[1], dict(counts))
+        return nodes
+
+    @property
+    def edges(self):
+        return {(self.codebook[v_i], self.codebook[v_j]): tuple(freq)
+                for (v_i, v_j), freq in zip(self._edge_codes.tolist(),
+                                            self._edge_freq.tolist())}
+
+    def __eq__(self, other):
+        if not isinstance(other, Model):
+            return NotImplemented
+        if self is other:
+            return True
+        if (self.codebook is other.codebook) and \
+           np.array_equal(self._node_codes, other._node_codes) and \
+           np.array_equal(self._node_freq, other._node_freq) and \
+           np.array_equal(self._edge_codes, other._edge_codes) and \
+           np.array_equal(self._edge_freq, other._edge_freq) and \
+           (self._node_counts == other._node_counts):
+            return True
+        return (self.nodes == other.nodes) and (self.edges == other.edges)
+
+    def __hash__(self):
+        if self._hash is None:
+            # Independent of the order of nodes and edges and of codebook
+            nodes = frozenset((v, freq[0], freq[1])
+                              for v, freq in self.nodes.items())
+            object.__setattr__(self, '_hash',
+                               hash((nodes, frozenset(self.edges.items()))))
+        return self._hash
+
+    def __repr__(self):
+        return 'Model(nodes={}, edges={}, rates={})'.format(
+            len(self._node_codes), len(self._edge_codes), self.rates)
+
+def _restore(codebook, rates, node_counts, dtype, freq_dtype, arrays):
+    """Unpickle Model."""
+    node_codes, node_freq, edge_codes, edge_freq = arrays
+    model = Model.__new__(Model)
+    set_ = object.__setattr__
+    set_(model, 'codebook', codebook)
+    set_(model, 'rates', rates)
+    set_(model, '_node_codes', np.frombuffer(node_codes, dtype=dtype))
+    set_(model, '_node_freq', np.frombuffer(node_freq, freq_dtype).reshape(-1, 2))
+    set_(model, '_node_counts', node_counts)
+    set_(model, '_edge_codes', np.frombuffer(edge_codes, dtype=dtype).reshape(-1, 2))
+    set_(model, '_edge_freq', np.frombuffer(edge_freq, freq_dtype).reshape(-1, 2))
+    set_(model, '_hash', None)
+    return model
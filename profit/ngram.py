@@ -0,0 +1,134 @@
+import numpy as np
+
+class NGramIndex(object):
+    """Index of length-k relations (k-grams) of activities in the log,
+    i.e. sequences of k activities following each other in a case.
+
+    The log is encoded into a flat array of activity codes once, and
+    k-grams are encoded as integers with a rolling base-|A| code:
+    code(a_1..a_k) = code(a_1..a_k-1) * |A| + code(a_k). So the
+    relations of length k are derived from the ones of length k-1
+    without slicing the traces. Encoding is exact (no hash collisions),
+    thus |A| ** max_k should fit into 64-bit integer.
+
+    Graph.find_cycles does not use the index: cycles may be as long as
+    the number of activities, which can not be encoded this way, and
+    their occurrences depend on the edges of the model, not only on the
+    sequence of activities.
+
+    Attributes
+    ----------
+    activities: list
+        Encoded activities (the index of an activity is its code)
+    max_k: int
+        Maximum length of relations in the index
+
+    See Also
+    ---------
+    TransitionMatrix
+
+    Examples
+    --------
+    >>> index = NGramIndex(log, max_k=3)
+    >>> index.relations(3)
+    >>> index.count(('A', 'B', 'A'))
+    """
+
+    def __init__(self, log, max_k=3):
+        """Build the index.
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events
+        max_k: int
+            Maximum length of relations to index (default 3)
+        """
+        self.activities = sorted(log.activities, key=str)
+        self.max_k = max_k
+        self._index = {a: i for i, a in enumerate(self.activities)}
+        self._base = max(len(self.activities), 1)
+        if max_k < 1:
+            raise ValueError('Relation length should be positive')
+        if self._base ** max_k >= 2 ** 63:
+            raise ValueError('Relations of length {} can not be encoded '
+                             'for {} activities'.format(max_k, self._base))
+
+        traces = log.flat_log.values()
+        lengths = np.fromiter((len(t) for t in traces), dtype=np.int64,
+                              count=len(traces))
+        codes = np.fromiter((self._index[a] for t in traces for a in t),
+                            dtype=np.int64, count=lengths.sum())
+        case_ind = np.repeat(np.arange(len(lengths)), lengths)
+        ends = np.cumsum(lengths)
+        # Number of events till the end of the case (inclusive)
+        remain = ends[case_ind] - np.arange(len(codes))
+
+        self._keys, self._freq = dict(), dict()
+        keys = codes
+        for k in range(1, max_k + 1):
+            if k > 1:
+                keys = keys[:-1] * self._base + codes[k-1:]
+            valid = remain[:len(keys)] >= k
+            self._count(k, keys[valid], case_ind[:len(keys)][valid])
+
+    def _count(self, k, keys, case_ind):
+        """Count absolute and case frequencies of encoded k-grams."""
+        uniq, abs_freq = np.unique(keys, return_counts=True)
+        order = np.lexsort((keys, case_ind))
+        keys_s, case_s = keys[order], case_ind[order]
+        first = np.ones(len(keys_s), dtype=bool)
+        first[1:] = (keys_s[1:] != keys_s[:-1]) | (case_s[1:] != case_s[:-1])
+        _, case_freq = np.unique(keys_s[first], return_counts=True)
+        self._keys[k] = uniq
+        self._freq[k] = np.stack([abs_freq, case_freq], axis=1)
+
+    def _encode(self, pattern):
+        key = 0
+        for a in pattern:
+            if a not in self._index:
+                return None
+            key = key * self._base + self._index[a]
+        return key
+
+    def _decode(self, key, k):
+        pattern = []
+        for _ in range(k):
+            key, c = divmod(key, self._base)
+            pattern.append(self.activities[c])
+        return tuple(pattern[::-1])
+
+    def count(self, pattern):
+        """Return absolute and case frequencies of a relation, i.e.
+        a sequence of activities following each other.
+        """
+        k = len(pattern)
+        if (k < 1) | (k > self.max_k):
+            raise ValueError('Relation length is out of range')
+        key = self._encode(pattern)
+        keys = self._keys[k]
+        i = np.searchsorted(keys, key) if key is not None else len(keys)
+        if (i == len(keys)) or (keys[i] != key):
+            return (0, 0)
+        return tuple(int(f) for f in self._freq[k][i])
+
+    def relations(self, k=2, min_case_freq=0):
+        """Return relations of length k as a dictionary where the key
+        is a sequence of activities and the value is a tuple of its
+        absolute and case frequencies.
+
+        Parameters
+        ----------
+        k: int
+            Length of relations (default 2, i.e. directly-follows
+            relations as in TransitionMatrix)
+        min_case_freq: int
+            Return only relations occurring at least in this number
+            of cases (default 0)
+        """
+        if (k < 1) | (k > self.max_k):
+            raise ValueError('Relation length is out of range')
+        keys, freq = self._keys[k], self._freq[k]
+        mask = freq[:, 1] >= min_case_freq
+        return {self._decode(int(key), k): (int(f[0]), int(f[1]))
+                for key, f in zip(keys[mask], freq[mask])}
@@ -0,0 +1,272 @@
+"""Case-parallel statistics of a log over shared memory.
+
+The encoded log (activity codes and offsets of the traces, see Log)
+is put into shared memory once, and worker processes attach to it when
+they start, so that the log is never pickled. Statistics are computed
+by per-case kernels on contiguous chunks of cases (balanced by the
+number of events) and merged in the order of chunks, so the results do
+not depend on the order in which workers finish. Counts are exactly
+the same as the ones computed in a single process; sums of losses may
+differ in the last digits, as they are summed by chunks.
+
+Examples
+--------
+>>> with ParallelBackend(log, workers=32) as backend:
+...     TM = backend.transition_matrix()
+...     S = backend.node_significance()
+...     G.optimize(log, TM, 0.5, 10, backend=backend)
+"""
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from transition_matrix import TransitionMatrix
+from conformance import CompiledModel
+from graph import Graph
+from model import Model
+
+_SHARED = dict() # encoded log attached by the worker process
+
+def _attach(spec):
+    """Attach worker process to the encoded log in shared memory."""
+    _SHARED.clear()
+    _SHARED['labels'] = spec['labels']
+    for name in ['codes', 'offsets']:
+        shm_name, shape, dtype = spec[name]
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _SHARED[name + '_shm'] = shm
+        _SHARED[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _chunk(lo, hi):
+    """Return codes and offsets (from 0) of the cases lo..hi-1."""
+    offsets = _SHARED['offsets'][lo:hi+1]
+    return _SHARED['codes'][offsets[0]:offsets[-1]], offsets - offsets[0]
+
+def _transitions_kernel(lo, hi):
+    """Count transitions, starts and ends of the cases lo..hi-1."""
+    codes, offsets = _chunk(lo, hi)
+    L = len(_SHARED['labels'])
+    lengths = np.diff(offsets)
+    case = np.repeat(np.arange(hi - lo), lengths)
+    pairs = np.flatnonzero(case[:-1] == case[1:])
+    keys = codes[pairs] * L + codes[pairs + 1]
+    uniq, first, abs_freq = np.unique(keys, return_index=True,
+                                      return_counts=True)
+    order = np.lexsort((keys, case[pairs]))
+    keys_s, case_s = keys[order], case[pairs][order]
+    new = np.ones(len(keys_s), dtype=bool)
+    new[1:] = (keys_s[1:] != keys_s[:-1]) | (case_s[1:] != case_s[:-1])
+    _, case_freq = np.unique(keys_s[new], return_counts=True)
+    # Position of the first occurrence in the log to keep the order
+    # of transitions as in TransitionMatrix
+    first = pairs[first] + _SHARED['offsets'][lo]
+    nonempty = np.flatnonzero(lengths > 0)
+    starts = codes[offsets[:-1][nonempty]]
+    ends = codes[offsets[1:][nonempty] - 1]
+    bounds = []
+    for b in [starts, ends]:
+        b_uniq, b_first, b_cnt = np.unique(b, return_index=True,
+                                           return_counts=True)
+        bounds.append((b_uniq, nonempty[b_first] + lo, b_cnt))
+    return uniq, abs_freq, case_freq, first, bounds
+
+def _activities_kernel(lo, hi):
+    """Count cases with every activity among the cases lo..hi-1."""
+    codes, offsets = _chunk(lo, hi)
+    L = len(_SHARED['labels'])
+    case = np.repeat(np.arange(hi - lo, dtype=np.int64), np.diff(offsets))
+    keys = np.unique(case * L + codes)
+    return np.bincount(keys % L, minlength=L)
+
+def _fitness_kernel(lo, hi, model):
+    """Return replay losses of the cases lo..hi-1 (see CompiledModel)."""
+    offsets = _SHARED['offsets'][lo:hi+1]
+    scores = model.score_codes(_SHARED['codes'], offsets, _SHARED['labels'])
+    return float(scores['loss'].sum())
+
+def _cycles_kernel(lo, hi, nodes, edges):
+    """Count cycles in the cases lo..hi-1 (see Graph.count_cycles)."""
+    codes, offsets = _chunk(lo, hi)
+    labels = np.empty(len(_SHARED['labels']), dtype=object)
+    labels[:] = _SHARED['labels']
+    events = labels[codes]
+    G = Graph()
+    G.nodes, G.edges = nodes, edges
+    return G.count_cycles(tuple(events[offsets[i]:offsets[i+1]])
+                          for i in range(hi - lo))
+
+def _call(args):
+    kernel, args = args[0], args[1:]
+    return kernel(*args)
+
+class ParallelBackend(object):
+    """Parallel execution backend of per-case statistics.
+
+    Attributes
+    ----------
+    log: Log
+        Log the statistics are computed for
+    workers: int
+        Number of worker processes
+    chunks: list
+        Ranges of cases processed by a task
+
+    See Also
+    ---------
+    TransitionMatrix
+    node_significance
+    Graph.fitness
+    Graph.find_cycles
+    """
+
+    def __init__(self, log, workers=None, chunks=None):
+        """Put the encoded log into shared memory and start workers.
+
+        Parameters
+        ----------
+        log: Log
+            Ordered records of events
+        workers: int
+            Number of worker processes (default None, i.e. the number
+            of CPUs)
+        chunks: int
+            Number of chunks of cases (default None, i.e. 4 chunks
+            per worker)
+        """
+        self.log = log
+        self.workers = workers or os.cpu_count() or 1
+        log = log._ensure_encoded()
+        codes, offsets = np.ascontiguousarray(log.codes), \
+                         np.ascontiguousarray(log.offsets)
+        self._case_ids = log.case_ids
+        self._labels = log.labels
+        self._case_cnt = len(self._case_ids)
+        self._shm = []
+        spec = {'labels': self._labels}
+        for name, arr in [('codes', codes), ('offsets', offsets)]:
+            shm = shared_memory.SharedMemory(create=True,
+                                             size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            self._shm.append(shm)
+            spec[name] = (shm.name, arr.shape, arr.dtype.str)
+
+        n_chunks = chunks or 4 * self.workers
+        targets = np.linspace(0, offsets[-1], n_chunks + 1)
+        bounds = np.unique(np.concatenate((
+            [0], np.searchsorted(offsets, targets[1:-1]), [self._case_cnt])))
+        self.chunks = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        self._transit = None
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             initializer=_attach,
+                                             initargs=(spec,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop workers and release shared memory."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def _map(self, kernel, *args):
+        """Run kernel on every chunk, return results in chunk order."""
+        if self._executor is None:
+            raise ValueError('Backend is closed')
+        tasks = [(kernel, lo, hi) + args for lo, hi in self.chunks]
+        return list(self._executor.map(_call, tasks))
+
+    def _transitions(self):
+        """Return merged counts of transitions, starts and ends."""
+        if self._transit is None:
+            results = self._map(_transitions_kernel)
+            concat = lambda i: np.concatenate([r[i] for r in results] +
+                                              [np.zeros(0, dtype=np.int64)])
+            uniq, inv = np.unique(concat(0), return_inverse=True)
+            abs_freq = np.bincount(inv, concat(1), len(uniq)).astype(np.int64)
+            case_freq = np.bincount(inv, concat(2), len(uniq)).astype(np.int64)
+            first = np.full(len(uniq), np.iinfo(np.int64).max)
+            np.minimum.at(first, inv, concat(3))
+            bounds = []
+            for i in range(2):
+                cnt, first_case = dict(), dict()
+                for r in results:
+                    for c, f, n in zip(*[x.tolist() for x in r[4][i]]):
+                        cnt[c] = cnt.get(c, 0) + n
+                        first_case[c] = min(first_case.get(c, f), f)
+                bounds.append([(c, cnt[c]) for c in
+                               sorted(cnt, key=first_case.get)])
+            self._transit = (uniq, abs_freq, case_freq, first, bounds)
+        return self._transit
+
+    def transition_matrix(self):
+        """Return TransitionMatrix of the log (see
+        TransitionMatrix.update)."""
+        L = len(self._labels)
+        uniq, abs_freq, case_freq, first, _ = self._transitions()
+        T = dict()
+        for i in np.argsort(first, kind='stable').tolist():
+            a_i = self._labels[uniq[i] // L]
+            a_j = self._labels[uniq[i] % L]
+            if a_i not in T:
+                T[a_i] = dict()
+            T[a_i][a_j] = (int(abs_freq[i]), int(case_freq[i]))
+        TM = TransitionMatrix()
+        TM.T = T
+        return TM
+
+    def transit_matrix(self):
+        """Return transition matrix with 'start' and 'end' nodes
+        (see transit_matrix)."""
+        T = self.transition_matrix().T
+        starts, ends = self._transitions()[4]
+        T['start'] = {self._labels[c]: (n, n) for c, n in starts}
+        for c, n in ends:
+            e = self._labels[c]
+            if e not in T: T[e] = dict()
+            T[e]['end'] = (n, n)
+        return T
+
+    def node_significance(self):
+        """Return node significance, i.e. activities case frequencies
+        (see node_significance)."""
+        counts = sum(self._map(_activities_kernel))
+        index = {a: i for i, a in enumerate(self._labels)}
+        return {a: int(counts[index[a]]) / self._case_cnt
+                for a in self.log.activities}
+
+    def fitness(self, edges, T):
+        """Return the value of a cost function that includes only loss
+        term (see Graph.fitness) of the model with the edges.
+
+        Parameters
+        ----------
+        edges: dict / list / Model
+            Edges of the process model
+        T: dict
+            Transition matrix with 'start' and 'end' nodes
+        """
+        if isinstance(edges, Model):
+            edges = edges.edges
+        model = CompiledModel(edges, T, self._case_cnt)
+        return sum(self._map(_fitness_kernel, model)) + model._model_loss
+
+    def find_cycles(self, G, pre_traverse=False, ordered=False):
+        """Search cycles of the process model G in the log and count
+        their occurrences (see Graph.find_cycles)."""
+        cycles = dict()
+        for part in self._map(_cycles_kernel, G.nodes, G.edges):
+            for cycle, freq in part.items():
+                if cycle in cycles:
+                    cycles[cycle][0] += freq[0]
+                    cycles[cycle][1] += freq[1]
+                else:
+                    cycles[cycle] = freq
+        return G.merge_cycles(cycles, pre_traverse, ordered)
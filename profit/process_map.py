@@ -3,6 +3,20 @@ from log import Log
 from transition_matrix import TransitionMatrix
 from graph import Graph
 from renderer import Renderer
+from features import case_features
+from ngram import NGramIndex
+from cache import DiscoveryCache
+from discovery import PARAMS
+from stability import bootstrap_stability
+
+class _AnyEvent(object):
+    """Cancellation flag that is set if any of the events is set."""
+
+    def __init__(self, *events):
+        self.events = [e for e in events if e is not None]
+
+    def is_set(self):
+        return any(e.is_set() for e in self.events)
 
 class ProcessMap:
     """Class to perform a process model from event log.
@@ -74,30 +88,83 @@ class ProcessMap:
                 and white (default True)
             verbose: bool
                 If True, show optimization progress bar (default False)
+            joint: bool
+                If True and aggregate is True, find optimal rates and
+                cycle_rel together (default False)
+            cycle_rels: list
+                Grid points of cycle_rel for joint optimization
+                (default [0.1, 0.2, ..., 1.0])
+            executor: Executor
+                Executor to run joint optimization in parallel
+                (default None)
+            workers: int
+                Number of worker processes to compute statistics of
+                the log in parallel over shared memory (default None,
+                i.e. in a single process; see ParallelBackend)
+            cache: str / DiscoveryCache
+                Directory or object of on-disk cache for optimization
+                results (default None, i.e. no caching)
+            max_seconds: float
+                Time budget of optimization in seconds, the best
+                model found so far is used when it is exhausted
+                (default None, i.e. not limited)
+            max_evals: int
+                Maximum number of distinct models evaluated by
+                optimization (default None, i.e. not limited)
+            callback: callable
+                Function called with a dictionary of optimization
+                progress (default None)
+            cancel: threading.Event
+                If set, optimization is stopped and the best model
+                found so far is used (default None)
             render_format: string
                 Graphviz output format.
+            max_nodes: int
+                Maximum number of nodes to render, the least frequent
+                ones are collapsed into one node (default None)
+            max_edges: int
+                Maximum number of edges to render, the least frequent
+                ones are hidden, but every node keeps an incoming and
+                an outgoing edge (default None)
+            large_engine: str
+                Graphviz layout engine for large graphs, e.g. 'sfdp'
+                (default None, i.e. 'dot')
+            engine_threshold: int
+                Number of rendered nodes and edges to switch the
+                layout engine (default 300)
+            show_durations: bool
+                Show median durations of transitions on the edges,
+                if the log has timestamps (default False)
         """
         self.Log = Log()
         self.Rates = {'activities': 100, 'paths': 0}
-        self.Params = {'optimize': True,
-                       'lambd': 0.5,
-                       'step': 10,
-                       'verbose': False,
-                       'aggregate': False,
-                       'agg_type': 'outer',
-                       'heuristic': 'all',
-                       'pre_traverse': False,
-                       'ordered' : False,
-                       'cycle_rel': 0.5,
-                       'colored': True,
-                       'render_format': 'png'}
+        # Discovery parameters are shared with discover (see PARAMS)
+        self.Params = dict(PARAMS,
+                           cycle_rels=list(PARAMS['cycle_rels']),
+                           workers=None,
+                           colored=True,
+                           render_format='png',
+                           max_nodes=None,
+                           max_edges=None,
+                           large_engine=None,
+                           engine_threshold=300,
+                           show_durations=False)
         self._Observers = {'T': TransitionMatrix(),
                            'Graph': Graph(),
                            'Renderer': Renderer()}
+        self._NGrams = None
+        self._Backend = None
 
     def set_log(self, data=None, FILE_PATH='', cols=(0, 1), *args, **kwargs):
-        """Set Log attribute of the class."""
-        self.Log.update(data, FILE_PATH, cols=cols, *args, **kwargs)
+        """Set Log attribute of the class. Data may be a log or its
+        filtered view (see Log.filter_cases) to use as is."""
+        if isinstance(data, Log):
+            self.Log = data
+        else:
+            self.Log = Log()
+            self.Log.update(data, FILE_PATH, cols=cols, *args, **kwargs)
+        self._NGrams = None
+        self._Observers['Graph']._prepared = None
 
     def set_rates(self, activity_rate, path_rate):
         """Set Rates attribute of the class."""
@@ -122,20 +189,55 @@ class ProcessMap:
 
     def update(self):
         """Update "observers" and rates if settings were changed."""
-        self._Observers['T'].update(self.Log.flat_log)
+        self._update(self.Params['cancel'])
+
+    def _update(self, cancel):
+        """Update "observers" (see update); optimization is stopped
+        when cancel is set."""
+        backend = self._backend()
+        # Transitions and their durations are counted in one vectorized
+        # pass; the backend computes node significance, losses and cycles
+        self._update_T()
+        joint = self.Params['optimize'] & self.Params['aggregate'] \
+                & self.Params['joint']
 
-        if self.Params['optimize']:
+        if joint:
+            rates = self._Observers['Graph'].optimize_joint(self.Log,
+                                                            self._Observers['T'],
+                                                            self.Params['lambd'],
+                                                            self.Params['step'],
+                                                            self.Params['cycle_rels'],
+                                                            self.Params['agg_type'],
+                                                            self.Params['heuristic'],
+                                                            self.Params['pre_traverse'],
+                                                            self.Params['ordered'],
+                                                            self.Params['executor'],
+                                                            self.Params['verbose'])
+            self.Params['cycle_rel'] = rates.pop('cycle_rel')
+            self.Rates = rates
+        elif self.Params['optimize']:
+            cache = self.Params['cache']
+            if isinstance(cache, str):
+                cache = DiscoveryCache(cache)
             self.Rates = self._Observers['Graph'].optimize(self.Log,
                                                            self._Observers['T'],
                                                            self.Params['lambd'],
                                                            self.Params['step'],
-                                                           self.Params['verbose'])
+                                                           self.Params['verbose'],
+                                                           cache,
+                                                           self.Params['max_seconds'],
+                                                           self.Params['max_evals'],
+                                                           self.Params['callback'],
+                                                           cancel,
+                                                           backend)
         else:
+            S_node = backend.node_significance() if backend else None
             self._Observers['Graph'].update(self.Log,
                                             self.Rates['activities'],
                                             self.Rates['paths'],
-                                            self._Observers['T'])
-        if self.Params['aggregate']:
+                                            self._Observers['T'],
+                                            S_node)
+        if self.Params['aggregate'] & (not joint):
             self._Observers['Graph'].aggregate(self.Log,
                                                self.Rates['activities'],
                                                self.Rates['paths'],
@@ -143,12 +245,148 @@ class ProcessMap:
                                                self.Params['heuristic'],
                                                self.Params['pre_traverse'],
                                                self.Params['ordered'],
-                                               self.Params['cycle_rel'])
+                                               self.Params['cycle_rel'],
+                                               backend)
+
+        self._update_renderer()
+
+    async def update_async(self, executor=None):
+        """Perform update (see update) in the executor without blocking
+        the event loop.
+
+        If the task is cancelled, optimization is stopped cooperatively
+        (see cancel parameter) and the model is completed with the best
+        rates found so far in the background.
+
+        Parameters
+        ----------
+        executor: Executor
+            Thread pool to run update in (default None, i.e. the default
+            executor of the event loop)
+
+        Examples
+        --------
+        >>> await pm.update_async()
+        >>> image = await pm.render_async()
+        """
+        import asyncio
+        import threading
+        # The event of the call is set on cancellation, the event of
+        # the cancel parameter is only checked
+        cancelled = threading.Event()
+        cancel = _AnyEvent(cancelled, self.Params['cancel'])
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(executor, self._update, cancel)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    def _backend(self):
+        """Return parallel backend for the log, if workers are set."""
+        workers = self.Params['workers']
+        B = self._Backend
+        if (B is not None) and ((not workers) or (B.log is not self.Log) or
+                                (B.workers != workers)):
+            B.close()
+            B = self._Backend = None
+        if workers and (B is None):
+            from parallel import ParallelBackend
+            B = self._Backend = ParallelBackend(self.Log, workers)
+        return B
 
+    def close(self):
+        """Stop worker processes of the parallel backend, if any."""
+        if self._Backend is not None:
+            self._Backend.close()
+            self._Backend = None
+
+    def _update_T(self):
+        """Update transition matrix in one vectorized pass over the
+        encoded log (with durations of transitions, if the log has
+        timestamps; see TransitionMatrix.update_encoded)."""
+        if self.Log.codes is None:
+            self._Observers['T'].update(self.Log.flat_log)
+        else:
+            self._Observers['T'].update_encoded(self.Log)
+
+    def _update_renderer(self, model=None):
+        """Update Renderer with the current model (or the model
+        passed) and parameters."""
         self._Observers['Renderer'].update(self._Observers['T'],
-                                           self._Observers['Graph'],
+                                           model or self._Observers['Graph'],
                                            self.Params['colored'],
-                                           self.Params['render_format'])
+                                           self.Params['render_format'],
+                                           self.Params['max_nodes'],
+                                           self.Params['max_edges'],
+                                           self.Params['large_engine'],
+                                           self.Params['engine_threshold'],
+                                           self.Params['show_durations'])
+
+    def update_paths(self, path_rate):
+        """Set path rate and update "observers" without optimization.
+        Edge admission thresholds are computed once for the current log
+        and activity rate (see Graph.prepare), so that changing the
+        path rate is fast."""
+        self.set_rates(self.Rates['activities'], path_rate)
+        G = self._Observers['Graph']
+        P = G._prepared
+        if (P is None) or (P['log'] is not self.Log) or \
+           (P['activity_rate'] != self.Rates['activities']):
+            self._update_T()
+            G.prepare(self.Log, self.Rates['activities'], self._Observers['T'])
+        G.update_paths(path_rate)
+        if self.Params['aggregate']:
+            G.aggregate(self.Log,
+                        self.Rates['activities'],
+                        self.Rates['paths'],
+                        self.Params['agg_type'],
+                        self.Params['heuristic'],
+                        self.Params['pre_traverse'],
+                        self.Params['ordered'],
+                        self.Params['cycle_rel'],
+                        self._backend())
+        self._update_renderer()
+
+    def reoptimize(self, lambd):
+        """Choose optimal rates for another lambd among the models
+        evaluated by the last optimization without new search (see
+        Graph.reoptimize). Aggregation and rendering are performed
+        with the new rates, if required."""
+        self.Params['lambd'] = lambd
+        self.Rates = self._Observers['Graph'].reoptimize(lambd)
+        if self.Params['aggregate']:
+            self._Observers['Graph'].aggregate(self.Log,
+                                               self.Rates['activities'],
+                                               self.Rates['paths'],
+                                               self.Params['agg_type'],
+                                               self.Params['heuristic'],
+                                               self.Params['pre_traverse'],
+                                               self.Params['ordered'],
+                                               self.Params['cycle_rel'],
+                                               self._backend())
+        self._update_renderer()
+        return self.Rates
+
+    def sweep_aggregation(self, cycle_rels, agg_types=None, heuristics=None):
+        """Return aggregated models for every combination of cycle_rel,
+        agg_type and heuristic values with the current rates (see
+        Graph.aggregate_sweep). The current model is not changed."""
+        G = self._Observers['Graph']
+        nodes, edges = G.nodes, G.edges
+        G.update(self.Log, self.Rates['activities'], self.Rates['paths'],
+                 self._Observers['T'])
+        try:
+            return G.aggregate_sweep(self.Log,
+                                     self.Rates['activities'],
+                                     self.Rates['paths'],
+                                     cycle_rels,
+                                     agg_types or (self.Params['agg_type'],),
+                                     heuristics or (self.Params['heuristic'],),
+                                     self.Params['pre_traverse'],
+                                     self.Params['ordered'])
+        finally:
+            G.nodes, G.edges = nodes, edges
 
     def get_log(self):
         """Return flat log (see Log)."""
@@ -162,20 +400,85 @@ class ProcessMap:
         """Return parameters of process model discovering."""
         return self.Params
 
+    def get_pareto_front(self):
+        """Return trade-off between losses and complexity of the models
+        evaluated by the last optimization (see Graph.pareto_front)."""
+        return self._Observers['Graph'].pareto_front()
+
+    def get_optimization(self):
+        """Return status of the last optimization: whether the search
+        finished within the budget, the numbers of grid points done and
+        total, the number of evaluated models and elapsed time."""
+        return self._Observers['Graph'].optimization
+
     def get_T(self):
         """Return transition matrix (see TransitionMatrix)."""
         return self._Observers['T'].T
 
-    def get_graph(self):
-        """Return process model structure as a set of edges (see Graph)."""
+    def get_durations(self):
+        """Return durations of transitions: count, mean and quantiles
+        (see TransitionMatrix.update_encoded)."""
+        return self._Observers['T'].durations
+
+    def get_relations(self, k=2, min_case_freq=0):
+        """Return length-k relations in the log with their absolute
+        and case frequencies (see NGramIndex). The index is built
+        once per log."""
+        if (self._NGrams is None) or (self._NGrams.max_k < k):
+            self._NGrams = NGramIndex(self.Log, max_k=max(k, 3))
+        return self._NGrams.relations(k, min_case_freq)
+
+    def get_stability(self, n_boot=200, percentiles=(2.5, 97.5), seed=None):
+        """Return how often every node and edge appears in the models
+        discovered with the current rates from bootstrap resamples of
+        the log, and intervals of their frequencies (see
+        bootstrap_stability)."""
+        return bootstrap_stability(self.Log,
+                                   self.Rates['activities'],
+                                   self.Rates['paths'],
+                                   n_boot, percentiles, seed)
+
+    def get_graph(self, model=None):
+        """Return process model structure as a set of edges (see Graph)
+        of the current model or of the model passed (see Model)."""
+        if model is not None:
+            return model.edges
         return self._Observers['Graph'].edges
 
-    def render(self, show_only=False, save_path=None, gv_format_save=False):
+    def get_model(self):
+        """Return the current process model as an immutable compact
+        Model with the current rates (see Graph.freeze)."""
+        return self._Observers['Graph'].freeze((self.Rates['activities'],
+                                                self.Rates['paths']))
+
+    def get_features(self, sparse=True, model=None):
+        """Return a case-feature matrix (transition counts, meta states
+        occurrences and conformance), feature names and case ids
+        (see case_features) for the current model or for the model
+        passed (see Model)."""
+        return case_features(self.Log,
+                             model or self._Observers['Graph'],
+                             self._Observers['T'],
+                             ordered=self.Params['ordered'],
+                             sparse=sparse)
+
+    def render(self, show_only=False, save_path=None, gv_format_save=False,
+               model=None):
         """Return a graph object that can be rendered with the Graphviz 
-        installation (see Renderer)."""
+        installation (see Renderer). If model (see Model) is passed,
+        it is rendered instead of the current one."""
+        if model is not None:
+            self._update_renderer(model)
         if show_only:
             self._Observers['Renderer'].show()
         if save_path:
             self._Observers['Renderer'].save(save_path, gv_format_save=gv_format_save)
         return self._Observers['Renderer'].GV
+
+    async def render_async(self, save_path=None, gv_format_save=False):
+        """Render graph in a Graphviz subprocess without blocking the
+        event loop. Return rendered graph as bytes (see
+        Renderer.render_async)."""
+        return await self._Observers['Renderer'].render_async(save_path,
+                                                              gv_format_save)
         
@@ -4,10 +4,10 @@ color_map = {range(0,10) : "#1d2559", range(10,20) : "#203078",
              range(60,70) : "#a09dde", range(70,80) : "#c0bde9",
              range(80,90) : "#e0ddf4", range(90,101) : "#ffffff"}
 from observer_abc import Observer
-import graphviz as gv
 import os
 
 DECORATE = False
+OTHER = '__other__' # name of the node that collapses low-frequency nodes
 
 def _decorate_label(label, sep='_', max_len=15):
     """Text wrapping to the next line by sep."""
@@ -27,6 +27,69 @@ def _decorate_label(label, sep='_', max_len=15):
             beg += id_sep + 1
     return new_label
 
+def _format_duration(value, time_unit=None):
+    """Return duration as a short string, e.g. '2d 5h' for seconds
+    (time_unit 's') or '12.5' for other units."""
+    if time_unit != 's':
+        return '{:g}'.format(value)
+    units = [('d', 86400), ('h', 3600), ('m', 60), ('s', 1)]
+    for i, (unit, size) in enumerate(units[:-1]):
+        if value >= size:
+            next_unit, next_size = units[i + 1]
+            return '{}{} {}{}'.format(int(value // size), unit,
+                                      int(value % size // next_size), next_unit)
+    return '{:g}s'.format(round(value, 1))
+
+def _level_of_detail(nodes, edges, F, max_nodes=None, max_edges=None):
+    """Reduce the graph to fit the size budget: the least frequent nodes
+    are collapsed into one node (OTHER) and the least frequent edges
+    are dropped, except the most frequent incoming and outgoing edges
+    of every node (so max_edges may be exceeded). Return reduced nodes,
+    edges and frequencies, and the number of collapsed nodes and
+    dropped edges.
+    """
+    collapsed, dropped = [], 0
+    if (max_nodes is not None) and (len(nodes) > max_nodes):
+        order = sorted(nodes, key=F.get, reverse=True)
+        # One place in the budget is for the collapsed node
+        keep = set(order[:max(max_nodes - 1, 0)])
+        collapsed = [v for v in order if v not in keep]
+        nodes = {v: nodes[v] for v in order if v in keep}
+        nodes[OTHER] = (sum(F[v] for v in collapsed),)
+        F = {v: F[v] for v in keep}
+        F[OTHER] = nodes[OTHER][0]
+        edges_ = dict()
+        for (a_i, a_j), freq in edges.items():
+            a_i = a_i if (a_i in keep) | (a_i in ['start', 'end']) else OTHER
+            a_j = a_j if (a_j in keep) | (a_j in ['start', 'end']) else OTHER
+            if (a_i == OTHER) & (a_j == OTHER):
+                dropped += 1
+                continue
+            if (a_i, a_j) in edges_:
+                dropped += 1
+                abs_freq, case_freq = edges_[(a_i, a_j)]
+                freq = (abs_freq + freq[0], max(case_freq, freq[1]))
+            edges_[(a_i, a_j)] = freq
+        edges = edges_
+    if (max_edges is not None) and (len(edges) > max_edges):
+        order = sorted(edges, key=lambda e: edges[e][0], reverse=True)
+        # Every node keeps its most frequent incoming and outgoing edges
+        # (except loops), even beyond the budget, so that no node is cut
+        # off from 'start' or 'end'
+        has_out, has_in = {'end'}, {'start'}
+        keep = set()
+        for a_i, a_j in order:
+            if (a_i != a_j) & ((a_i not in has_out) | (a_j not in has_in)):
+                keep.add((a_i, a_j))
+                has_out.add(a_i)
+                has_in.add(a_j)
+        for e in order:
+            if len(keep) >= max_edges: break
+            keep.add(e)
+        dropped += len(edges) - len(keep)
+        edges = {e: edges[e] for e in order if e in keep}
+    return nodes, edges, F, len(collapsed), dropped
+
 class Renderer(Observer):
     """Class to represent the visualization of a process model."""
 
@@ -35,7 +98,9 @@ class Renderer(Observer):
         object that can be rendered with the Graphviz installation."""
         self.GV = None
 
-    def update(self, TM, G, colored=True, render_format='png'):
+    def update(self, TM, G, colored=True, render_format='png', max_nodes=None,
+               max_edges=None, large_engine=None, engine_threshold=300,
+               show_durations=False):
         """Update graph object (GV attribute) and its representation: elements 
         count, node color, edge thickness, etc.
 
@@ -43,17 +108,40 @@ class Renderer(Observer):
         ----------
         TM: TransitionMatrix
             A matrix describing the transitions of a Markov chain
-        G: Graph
+        G: Graph / Model
             Graph structure of the model
         colored: bool
             Whether represent graph elements in color or in black
             and white (default True)
+        render_format: str
+            Graphviz output format (default 'png')
+        max_nodes: int
+            Maximum number of nodes to draw: the least frequent nodes
+            are collapsed into one node "Other activities" (default
+            None, i.e. all nodes are drawn)
+        max_edges: int
+            Maximum number of edges to draw: the least frequent edges
+            are dropped, but every node keeps an incoming and an
+            outgoing edge (default None, i.e. all edges are drawn)
+        large_engine: str
+            Graphviz layout engine (e.g., 'sfdp') for the graphs with
+            more than engine_threshold elements (default None, i.e.
+            'dot' is used for all graphs)
+        engine_threshold: int
+            Number of nodes and edges to switch the layout engine
+            (default 300)
+        show_durations: bool
+            Show median durations of transitions (see
+            TransitionMatrix.update_encoded) on the edges (default
+            False)
 
         References
         ----------
         .. [1] Ferreira, D. R. (2017). A primer on process mining. Springer, Cham.
         """
+        import graphviz as gv
         T, nodes, edges = TM.T, G.nodes, G.edges
+        durations = getattr(TM, 'durations', dict())
         G = gv.Digraph(strict=False, format=render_format)
         G.attr('edge', fontname='Sans Not-Rotated 14')
         G.attr('node', shape='box', style='filled', fontname='Sans Not-Rotated 14')
@@ -67,6 +155,17 @@ class Renderer(Observer):
             else:
                 F[a] = a_freq[0]
         case_cnt = sum([v[0] for v in T['start'].values()])
+        nodes, edges, F, n_collapsed, n_dropped = \
+            _level_of_detail(nodes, edges, F, max_nodes, max_edges)
+        if n_collapsed | n_dropped:
+            note = []
+            if n_collapsed:
+                note.append('{} least frequent activities are collapsed'.format(n_collapsed))
+            if n_dropped:
+                note.append('{} least frequent transitions are hidden'.format(n_dropped))
+            G.attr(label='\n'.join(note), labelloc='b', fontname='Sans Not-Rotated 14')
+        if (large_engine is not None) & (len(nodes) + len(edges) > engine_threshold):
+            G.engine = large_engine
         x_max, x_min = max(F.values()), min(F.values())
         for a, a_freq in nodes.items():
             color = int((x_max - F[a]) / (x_max - x_min + 1e-6) * 100.)
@@ -79,7 +178,12 @@ class Renderer(Observer):
             else: fill = 'gray' + str(color)
             if color < 50:
                 font = 'white'
-            if type(a) == tuple:
+            if a == OTHER:
+                node_label = 'Other activities ({})'.format(n_collapsed) + \
+                             '\n(' + str(F[a]) + ')'
+                G.node(str(a), label=node_label, fillcolor=fill, fontcolor=font,
+                       shape='folder', style='filled,dashed')
+            elif type(a) == tuple:
                 if type(a_freq[-1]) == dict:
                     add_counts = [' ('+str(a_freq[-1][c])+')' for c in a]
                 else: add_counts = [''] * len(a)
@@ -107,7 +211,11 @@ class Renderer(Observer):
                 G.edge(str(e[0]), str(e[1]), label=str(freq[0]), style='dashed')
             else:
                 y = 1.0 + (5.0 - 1.0) * (freq[0] - t_min) / (t_max - t_min + 1e-6)
-                G.edge(str(e[0]), str(e[1]), label=str(freq[0]), penwidth=str(y))
+                label = str(freq[0])
+                if show_durations & (e[1] in durations.get(e[0], {})):
+                    label += '\n' + _format_duration(durations[e[0]][e[1]][0.5],
+                                                      TM.time_unit)
+                G.edge(str(e[0]), str(e[1]), label=label, penwidth=str(y))
         
         self.GV = G
 
@@ -132,3 +240,33 @@ class Renderer(Observer):
         self.GV.render(save_path, view=False)
         if not gv_format_save:
             os.remove(save_path)
+
+    async def render_async(self, save_path=None, gv_format_save=False):
+        """Render graph in a Graphviz subprocess without blocking
+        the event loop. Return rendered graph as bytes and, if
+        save_path is indicated, save it in save_path.<format>
+        (and the graph in DOT language in save_path, if gv_format_save
+        is True). If the task is cancelled, the subprocess is killed.
+        """
+        import asyncio
+        proc = await asyncio.create_subprocess_exec(
+            'dot', '-K' + self.GV.engine, '-T' + self.GV.format,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        try:
+            out, err = await proc.communicate(self.GV.source.encode('utf-8'))
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise RuntimeError('Graphviz failed with code {}: {}'.format(
+                proc.returncode, err.decode('utf-8', 'replace').strip()))
+        if save_path:
+            with open(save_path + '.' + self.GV.format, 'wb') as f:
+                f.write(out)
+            if gv_format_save:
+                with open(save_path, 'w', encoding='utf-8') as f:
+                    f.write(self.GV.source)
+        return out
@@ -0,0 +1,328 @@
+"""Local HTTP service for process model discovery.
+
+Parsed logs are kept in memory in a bounded pool, so that several
+clients can discover process models from the same logs without
+re-reading them. Discovery requests are run concurrently in a pool
+of workers.
+
+Endpoints
+---------
+GET /logs
+    List logs in the pool
+POST /logs
+    Read a log into the pool: {"id": "monitoring", "path": "log.csv",
+    "cols": [0, 1], "read_kwargs": {"encoding": "cp1251"}}
+DELETE /logs/<id>
+    Remove a log from the pool
+POST /discover
+    Discover a process model: {"log": "monitoring", "rates":
+    {"activities": 80, "paths": 5}, "params": {"optimize": false},
+    "render": false}. Parameters that refer to server resources (see
+    SERVER_PARAMS) are not accepted. The response contains the rates, the graph
+    (nodes and edges with their frequencies), the rendered image in
+    base64 (if "render" is true) and the request timing in seconds.
+
+Examples
+--------
+$ python service.py --port 8000 --cache ./cache
+>>> service = DiscoveryService(port=0).start()
+>>> service.url
+'http://127.0.0.1:49157'
+>>> service.stop()
+"""
+import json
+import time
+import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from log import Log
+from process_map import ProcessMap
+from cache import DiscoveryCache
+
+# Discovery parameters set by the server only (e.g., the cache directory
+# should not be chosen by clients, as cached results are unpickled, and
+# workers would start a pool of processes per request)
+SERVER_PARAMS = ['cache', 'callback', 'cancel', 'executor', 'workers']
+
+class LogPool(object):
+    """Bounded pool of parsed logs. The least recently used log is
+    removed when the pool is full."""
+
+    def __init__(self, max_logs=8):
+        """Class Constructor."""
+        self.max_logs = max_logs
+        self._logs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, log_id, data=None, FILE_PATH='', cols=(0, 1), **kwargs):
+        """Read log (see Log.update) and put it into the pool."""
+        log = Log()
+        log.update(data, FILE_PATH, cols=tuple(cols), **kwargs)
+        self.put(log_id, log)
+        return log
+
+    def put(self, log_id, log):
+        """Put parsed log into the pool."""
+        with self._lock:
+            self._logs[log_id] = log
+            self._logs.move_to_end(log_id)
+            while len(self._logs) > self.max_logs:
+                self._logs.popitem(last=False)
+
+    def get(self, log_id):
+        """Return log from the pool (KeyError, if there is no such log)."""
+        with self._lock:
+            log = self._logs[log_id]
+            self._logs.move_to_end(log_id)
+            return log
+
+    def remove(self, log_id):
+        """Remove log from the pool."""
+        with self._lock:
+            del self._logs[log_id]
+
+    def info(self):
+        """Return short description of logs in the pool."""
+        with self._lock:
+            return [{'id': log_id, 'cases': len(log.cases),
+                     'activities': len(log.activities)}
+                    for log_id, log in self._logs.items()]
+
+def _node_id(v):
+    """Return JSON representation of a node (meta state is a list)."""
+    return list(v) if type(v) == tuple else v
+
+def graph_to_json(nodes, edges):
+    """Return process model as JSON serializable dictionary."""
+    nodes_ = []
+    for v, freq in nodes.items():
+        node = {'id': _node_id(v), 'abs': freq[0], 'case': freq[1]}
+        if (len(freq) > 2) and (type(freq[2]) == dict):
+            node['activities'] = freq[2]
+        nodes_.append(node)
+    edges_ = [{'source': _node_id(e[0]), 'target': _node_id(e[1]),
+               'abs': freq[0], 'case': freq[1]} for e, freq in edges.items()]
+    return {'nodes': nodes_, 'edges': edges_}
+
+class ServiceError(Exception):
+    """Client error with HTTP status code."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def discover(log, rates=None, params=None, render=False, cache=None):
+    """Discover process model from the log. Return rates, graph and
+    rendered image (if required) with timing. Optimization results are
+    cached in the cache of the server (if any)."""
+    pm = ProcessMap()
+    try:
+        pm.Log = log
+        if rates:
+            try: pm.set_rates(rates['activities'], rates['paths'])
+            except KeyError as e:
+                raise ServiceError(400, 'No rate {}'.format(e))
+            except ValueError as e:
+                raise ServiceError(400, str(e))
+        params = dict(params or {})
+        unknown = [p for p in params if p not in pm.Params]
+        if unknown:
+            raise ServiceError(400, 'No such parameters: {}'.format(unknown))
+        forbidden = [p for p in params if p in SERVER_PARAMS]
+        if forbidden:
+            raise ServiceError(400, 'Parameters are set by the server: {}'.\
+                                    format(forbidden))
+        pm.set_params(cache=cache, **params)
+        t = time.perf_counter()
+        pm.update()
+        response = {'rates': pm.get_rates()}
+        response.update(graph_to_json(pm._Observers['Graph'].nodes,
+                                      pm._Observers['Graph'].edges))
+        timing = {'discovery': time.perf_counter() - t}
+        if render:
+            t = time.perf_counter()
+            image = pm._Observers['Renderer'].GV.pipe()
+            response['image'] = base64.b64encode(image).decode('ascii')
+            response['format'] = pm.Params['render_format']
+            timing['render'] = time.perf_counter() - t
+        response['timing'] = timing
+        return response
+    finally:
+        pm.close()
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler (the service is the server attribute)."""
+
+    def log_message(self, format, *args):
+        if self.server.service.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body):
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise ServiceError(400, 'Invalid JSON')
+        if not isinstance(body, dict):
+            raise ServiceError(400, 'JSON object is expected')
+        return body
+
+    def _handle(self, method):
+        t = time.perf_counter()
+        service = self.server.service
+        path = self.path.rstrip('/')
+        try:
+            if (method, path) == ('GET', '/logs'):
+                status, body = 200, {'logs': service.pool.info()}
+            elif (method, path) == ('POST', '/logs'):
+                status, body = 201, service.load(self._body())
+            elif (method == 'DELETE') and path.startswith('/logs/'):
+                try: service.pool.remove(path[len('/logs/'):])
+                except KeyError:
+                    raise ServiceError(404, 'No such log')
+                status, body = 200, {}
+            elif (method, path) == ('POST', '/discover'):
+                status, body = 200, service.discover(self._body())
+            else:
+                raise ServiceError(404, 'No such endpoint')
+        except ServiceError as e:
+            status, body = e.status, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': '{}: {}'.format(type(e).__name__, e)}
+        body.setdefault('timing', dict())['total'] = time.perf_counter() - t
+        self._send(status, body)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+class DiscoveryService(object):
+    """Local HTTP service for process model discovery.
+
+    Attributes
+    ----------
+    pool: LogPool
+        Parsed logs kept in memory
+    executor: Executor
+        Pool of workers to perform log reading and discovery
+    cache: DiscoveryCache
+        On-disk cache of optimization results (None, if not used)
+    """
+
+    def __init__(self, host='127.0.0.1', port=8000, max_logs=8, workers=4,
+                 executor=None, cache=None, verbose=False):
+        """Class Constructor.
+
+        Parameters
+        ----------
+        host: str
+            Host to bind (default '127.0.0.1')
+        port: int
+            Port to bind, 0 to choose a free port (default 8000)
+        max_logs: int
+            Maximum number of logs in the pool (default 8)
+        workers: int
+            Number of workers for discovery requests (default 4)
+        executor: Executor
+            Executor to use instead of thread pool of workers
+            (default None)
+        cache: str / DiscoveryCache
+            Directory or object of on-disk cache for optimization
+            results shared by discovery requests (default None)
+        verbose: bool
+            If True, print requests (default False)
+        """
+        self.pool = LogPool(max_logs)
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers)
+        self.cache = DiscoveryCache(cache) if isinstance(cache, str) else cache
+        self.verbose = verbose
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def load(self, body):
+        """Read log into the pool."""
+        if 'id' not in body or 'path' not in body:
+            raise ServiceError(400, 'Log "id" and "path" are required')
+        t = time.perf_counter()
+        log = self.executor.submit(self.pool.load, body['id'],
+                                   FILE_PATH=body['path'],
+                                   cols=body.get('cols', (0, 1)),
+                                   **body.get('read_kwargs', {})).result()
+        return {'id': body['id'], 'cases': len(log.cases),
+                'activities': len(log.activities),
+                'timing': {'read': time.perf_counter() - t}}
+
+    def discover(self, body):
+        """Perform discovery request in the pool of workers."""
+        try: log = self.pool.get(body.get('log'))
+        except KeyError:
+            raise ServiceError(404, 'No such log')
+        t = time.perf_counter()
+        future = self.executor.submit(discover, log, body.get('rates'),
+                                      body.get('params'),
+                                      bool(body.get('render', False)),
+                                      self.cache)
+        response = future.result()
+        response['timing']['wait'] = (time.perf_counter() - t
+                                       - sum(response['timing'].values()))
+        return response
+
+    def serve_forever(self):
+        """Handle requests until stop is called."""
+        self._server.serve_forever()
+
+    def start(self):
+        """Handle requests in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop handling requests and release the port."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+        self.executor.shutdown(wait=False)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='ProFIT discovery service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-logs', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--cache', default=None,
+                        help='directory to cache optimization results in')
+    args = parser.parse_args()
+    service = DiscoveryService(args.host, args.port, args.max_logs,
+                               args.workers, cache=args.cache, verbose=True)
+    print('Serving on ' + service.url)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.stop()
+
+if __name__ == "__main__":
+    main()
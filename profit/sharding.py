@@ -0,0 +1,206 @@
+"""Transition matrix of a log sharded by time (e.g., daily files).
+
+Partial counts are computed per shard independently (possibly in
+parallel) and merged exactly:
+
+1. (optional) handshake: every shard reports its case ids (see
+   shard_cases), and the cases presented in several shards are found
+   (see spanning_cases);
+2. every shard computes PartialTransitionMatrix. For the cases that
+   span shards, the sets of transitions and activities are kept instead
+   of case frequencies, so that such a case is counted once;
+3. partial matrices are merged in the order of shards: the last event
+   of a case in a shard is joined with the first event of the case in
+   the next shard, and the first and the last events of the whole
+   case define 'start' and 'end' transitions.
+
+Shards must be ordered in time, i.e. all events of a case in a shard
+precede its events in the next shards.
+
+Examples
+--------
+>>> cases = [shard_cases(flat_log) for flat_log in shards]
+>>> spanning = spanning_cases(cases)
+>>> partials = [partial_transit(flat_log, i, spanning)
+...             for i, flat_log in enumerate(shards)]
+>>> TM = merge_partials(partials)
+>>> G = Graph()
+>>> G.update(TM.log(), 80, 5, TM.transit_matrix(), TM.node_significance())
+"""
+from log import Log
+from transition_matrix import TransitionMatrix
+
+def _add(d, key, val=1):
+    d[key] = d.get(key, 0) + val
+
+def shard_cases(flat_log):
+    """Return case ids of a shard (handshake)."""
+    return set(flat_log)
+
+def spanning_cases(shards_cases):
+    """Return cases presented in more than one shard (handshake)."""
+    seen, spanning = set(), set()
+    for cases in shards_cases:
+        spanning |= seen & cases
+        seen |= cases
+    return spanning
+
+class PartialTransitionMatrix(object):
+    """Mergeable transition counts of one or several consecutive shards.
+
+    Attributes
+    ----------
+    order: tuple
+        Order keys of the first and the last shard
+    abs_freq: dict
+        Absolute frequencies of transitions
+    case_freq: dict
+        Case frequencies of transitions for the cases that do not span
+        shards
+    act_freq: dict
+        Case frequencies of activities for the cases that do not span
+        shards
+    bounds: dict
+        The first and the last events of every case
+    spanning: dict
+        Sets of transitions and activities of the cases that (may) span
+        shards
+
+    See Also
+    ---------
+    TransitionMatrix
+    transit_matrix
+    """
+
+    def __init__(self, order=0):
+        """Class Constructor."""
+        self.order = (order, order)
+        self.abs_freq = dict()
+        self.case_freq = dict()
+        self.act_freq = dict()
+        self.bounds = dict()
+        self.spanning = dict()
+
+    def update(self, flat_log, spanning=None):
+        """Count transitions of a shard.
+
+        Parameters
+        ----------
+        flat_log: dict
+            Shard of event log as a dictionary where the key is
+            a case id and the value is a sequence of events
+        spanning: set
+            Cases that span shards (see spanning_cases). If None,
+            every case is considered as spanning, i.e. the result
+            is exact without handshake but uses more memory
+            (default None)
+        """
+        for case, trace in flat_log.items():
+            if not trace:
+                continue
+            pairs = list(zip(trace, trace[1:]))
+            for pair in pairs:
+                _add(self.abs_freq, pair)
+            self.bounds[case] = (trace[0], trace[-1])
+            if (spanning is None) or (case in spanning):
+                self.spanning[case] = (set(pairs), set(trace))
+            else:
+                for pair in set(pairs):
+                    _add(self.case_freq, pair)
+                for a in set(trace):
+                    _add(self.act_freq, a)
+        return self
+
+    def merge(self, other):
+        """Return merged partial matrix of this and the next shards."""
+        if not self.order[1] <= other.order[0]:
+            raise ValueError('Shards should be merged in order')
+        merged = PartialTransitionMatrix()
+        merged.order = (self.order[0], other.order[1])
+        for attr in ['abs_freq', 'case_freq', 'act_freq']:
+            d = dict(getattr(self, attr))
+            for key, val in getattr(other, attr).items():
+                _add(d, key, val)
+            setattr(merged, attr, d)
+        merged.bounds = dict(self.bounds)
+        merged.spanning = dict(self.spanning)
+        for case, (first, last) in other.bounds.items():
+            if case not in self.bounds:
+                merged.bounds[case] = (first, last)
+                if case in other.spanning:
+                    merged.spanning[case] = other.spanning[case]
+                continue
+            if (case not in self.spanning) | (case not in other.spanning):
+                raise ValueError('Case {} spans shards, but it was not '
+                                 'marked as spanning'.format(case))
+            # Transition between the shards
+            pair = (self.bounds[case][1], first)
+            _add(merged.abs_freq, pair)
+            merged.bounds[case] = (self.bounds[case][0], last)
+            pairs, acts = self.spanning[case]
+            other_pairs, other_acts = other.spanning[case]
+            merged.spanning[case] = (pairs | other_pairs | {pair},
+                                     acts | other_acts)
+        return merged
+
+    def _case_freq(self):
+        """Return case frequencies of transitions and activities."""
+        case_freq, act_freq = dict(self.case_freq), dict(self.act_freq)
+        for pairs, acts in self.spanning.values():
+            for pair in pairs:
+                _add(case_freq, pair)
+            for a in acts:
+                _add(act_freq, a)
+        return case_freq, act_freq
+
+    def transition_matrix(self):
+        """Return TransitionMatrix of the merged shards."""
+        case_freq, _ = self._case_freq()
+        TM = TransitionMatrix()
+        for (a_i, a_j), abs_freq in self.abs_freq.items():
+            if a_i not in TM.T:
+                TM.T[a_i] = dict()
+            TM.T[a_i][a_j] = (abs_freq, case_freq[(a_i, a_j)])
+        return TM
+
+    def transit_matrix(self):
+        """Return transition matrix with 'start' and 'end' nodes
+        (see transit_matrix)."""
+        T = self.transition_matrix().T
+        process_start, process_end = dict(), dict()
+        for s, e in self.bounds.values():
+            _add(process_start, s)
+            _add(process_end, e)
+        T['start'] = {s: (process_start[s],process_start[s]) for s in process_start}
+        for e in process_end:
+            if e not in T: T[e] = dict()
+            T[e]['end'] = (process_end[e],process_end[e])
+        return T
+
+    def node_significance(self):
+        """Return node significance, i.e. activities case frequencies
+        (see node_significance)."""
+        _, act_freq = self._case_freq()
+        return {a: act_freq[a] / len(self.bounds) for a in act_freq}
+
+    def log(self):
+        """Return Log with cases and activities of the merged shards
+        (flat_log is empty)."""
+        log = Log()
+        log.cases = set(self.bounds)
+        log.activities = set(self.act_freq) | {a for pairs, acts in
+                                               self.spanning.values()
+                                               for a in acts}
+        return log
+
+def partial_transit(flat_log, order=0, spanning=None):
+    """Return PartialTransitionMatrix of a shard."""
+    return PartialTransitionMatrix(order).update(flat_log, spanning)
+
+def merge_partials(partials):
+    """Merge partial transition matrices in the order of shards."""
+    partials = sorted(partials, key=lambda P: P.order)
+    merged = partials[0]
+    for P in partials[1:]:
+        merged = merged.merge(P)
+    return merged
@@ -0,0 +1,176 @@
+"""Bootstrap stability of the process model.
+
+The log is resampled with multinomial weights over its variants
+(distinct traces) instead of copying cases: the counts of transitions
+and activities of every variant are computed once (see
+VariantStatistics), and the statistics of a resample are their
+weighted sums. Every resampled model is discovered from these
+statistics with the same rates (see Graph.update), so the log is never
+scanned again.
+
+Examples
+--------
+>>> stability = bootstrap_stability(log, 80, 5, n_boot=500, seed=0)
+>>> stability['edges'][('A', 'B')]
+{'presence': 0.97, 'in_model': True, 'abs': (41.0, 67.0), 'case': (38.0, 61.0)}
+"""
+import numpy as np
+from log import Log
+from graph import Graph
+
+class VariantStatistics(object):
+    """Statistics of every variant (distinct trace) of the log:
+    transitions counts, activities, the first and the last activities.
+    The statistics of a log resampled with multinomial weights over
+    variants are weighted sums of them, so that resampled logs are
+    never built.
+
+    Attributes
+    ----------
+    traces: list
+        Variants of the log in the order of their first occurrence
+    counts: ndarray
+        Number of cases of every variant
+    activities: list
+        Activities of the log
+    pairs: list
+        Transitions between activities in the order of their first
+        occurrence (as in TransitionMatrix)
+    """
+
+    def __init__(self, log):
+        """Compute statistics of variants of the log."""
+        variants = dict()
+        for trace in log.flat_log.values():
+            variants[trace] = variants.get(trace, 0) + 1
+        self.traces = [t for t in variants if len(t) > 0]
+        self.counts = np.array([variants[t] for t in self.traces], dtype=np.int64)
+        self.activities = [a for a in log.activities]
+        act_index = {a: i for i, a in enumerate(self.activities)}
+        self.pairs, pair_index = [], dict()
+        pair_abs, pair_case, acts = ([], [], []), ([], []), ([], [])
+        self._starts, self._ends = [], []
+        for v, trace in enumerate(self.traces):
+            freq = dict()
+            for pair in zip(trace, trace[1:]):
+                if pair not in pair_index:
+                    pair_index[pair] = len(self.pairs)
+                    self.pairs.append(pair)
+                freq[pair_index[pair]] = freq.get(pair_index[pair], 0) + 1
+            for p, n in freq.items():
+                pair_abs[0].append(v); pair_abs[1].append(p); pair_abs[2].append(n)
+                pair_case[0].append(v); pair_case[1].append(p)
+            for a in set(trace):
+                acts[0].append(v); acts[1].append(act_index[a])
+            self._starts.append(act_index[trace[0]])
+            self._ends.append(act_index[trace[-1]])
+        as_array = lambda x: np.array(x, dtype=np.int64)
+        self._pair_abs = tuple(map(as_array, pair_abs))
+        self._pair_case = tuple(map(as_array, pair_case))
+        self._acts = tuple(map(as_array, acts))
+        self._starts, self._ends = as_array(self._starts), as_array(self._ends)
+        # Order of 'start' and 'end' transitions as in transit_matrix
+        self._start_order = list(dict.fromkeys(self._starts.tolist()))
+        self._end_order = list(dict.fromkeys(self._ends.tolist()))
+
+    def resample(self, weights):
+        """Return transition matrix with 'start' and 'end' nodes (see
+        transit_matrix) and node significance (see node_significance)
+        of the log where every variant occurs weights times."""
+        P, A = len(self.pairs), len(self.activities)
+        rows, cols, vals = self._pair_abs
+        abs_freq = np.bincount(cols, weights[rows] * vals, P).astype(np.int64)
+        rows, cols = self._pair_case
+        case_freq = np.bincount(cols, weights[rows], P).astype(np.int64)
+        rows, cols = self._acts
+        act_freq = np.bincount(cols, weights[rows], A).astype(np.int64)
+        starts = np.bincount(self._starts, weights, A).astype(np.int64)
+        ends = np.bincount(self._ends, weights, A).astype(np.int64)
+
+        T = dict()
+        for i in np.flatnonzero(case_freq).tolist():
+            a_i, a_j = self.pairs[i]
+            if a_i not in T:
+                T[a_i] = dict()
+            T[a_i][a_j] = (int(abs_freq[i]), int(case_freq[i]))
+        T['start'] = {self.activities[s]: (int(starts[s]), int(starts[s]))
+                      for s in self._start_order if starts[s] > 0}
+        for e in self._end_order:
+            if ends[e] == 0: continue
+            a = self.activities[e]
+            if a not in T: T[a] = dict()
+            T[a]['end'] = (int(ends[e]), int(ends[e]))
+        case_cnt = weights.sum()
+        S = {self.activities[i]: act_freq[i] / case_cnt
+             for i in range(A) if act_freq[i] > 0}
+        return T, S
+
+def bootstrap_stability(log, activity_rate, path_rate, n_boot=200,
+                        percentiles=(2.5, 97.5), seed=None):
+    """Estimate stability of nodes and edges of the process model by
+    bootstrap: the log is resampled n_boot times with multinomial
+    weights over its variants, and the model is discovered with the
+    same rates from the statistics of every resample (see
+    VariantStatistics).
+
+    Parameters
+    ----------
+    log: Log
+        Ordered records of events
+    activity_rate: float
+        The inverse value to node significance threshold
+    path_rate: float
+        The inverse value to edge significance threshold
+    n_boot: int
+        Number of resamples (default 200)
+    percentiles: tuple
+        Percentiles of the frequency interval (default (2.5, 97.5))
+    seed: int
+        Seed of random numbers generator (default None)
+
+    Returns
+    =======
+    dict: with 'nodes' and 'edges' keys, where every node and edge that
+        appeared in the models of resamples is mapped to its presence
+        (fraction of models it appears in), whether it is in the model
+        discovered from the log ('in_model'), and intervals of its
+        absolute and case frequencies over the models it appears in
+        ('abs' and 'case'; None, if it never appeared)
+
+    Notes
+    -----
+    Meta states (see Graph.aggregate) are not considered.
+    """
+    stats = VariantStatistics(log)
+    rng = np.random.default_rng(seed)
+    case_cnt = int(stats.counts.sum())
+    G = Graph()
+    G.update(log, activity_rate, path_rate, *stats.resample(stats.counts))
+    model = (set(G.nodes), set(G.edges))
+    # Only the number of cases and the activities of the log are used
+    # by discovery, if the statistics are passed
+    log_ = Log()
+    log_.cases = log.cases
+    freq = ({}, {})
+    for _ in range(n_boot):
+        weights = rng.multinomial(case_cnt, stats.counts / case_cnt)
+        T, S = stats.resample(weights)
+        log_.activities = set(S)
+        G.update(log_, activity_rate, path_rate, T, S)
+        for elements, f in zip([G.nodes, G.edges], freq):
+            for x, value in elements.items():
+                f.setdefault(x, []).append(value[:2])
+    result = dict()
+    for key, f, in_model in zip(['nodes', 'edges'], freq, model):
+        result[key] = dict()
+        for x in f:
+            values = np.array(f[x])
+            result[key][x] = {
+                'presence': len(values) / n_boot,
+                'in_model': x in in_model,
+                'abs': tuple(np.percentile(values[:, 0], percentiles).tolist()),
+                'case': tuple(np.percentile(values[:, 1], percentiles).tolist())}
+        for x in in_model - set(f):
+            result[key][x] = {'presence': 0.0, 'in_model': True,
+                              'abs': None, 'case': None}
+    return result
@@ -0,0 +1,282 @@
+"""Transition matrix of an unbounded event stream in fixed memory.
+
+Transitions, starts, ends and activities are counted by Space-Saving
+sketches [1]_ of a fixed capacity, and open cases are closed (evicted)
+when they are idle for too long or when there are too many of them,
+so that memory does not depend on the length of the stream.
+
+Memory bound
+------------
+The sketches keep at most capacity transitions and act_capacity
+activities, starts and ends. Every open case also keeps the sets of its
+distinct transitions and activities, so that they are counted once per
+case. These sets are not bounded by the sketches: the memory is
+O(capacity + act_capacity + max_open_cases * (P + A)), where P and A
+are the maximal numbers of distinct transitions and activities of an
+open case (both at most the number of distinct activities of the
+stream, squared for P).
+
+Error bounds
+------------
+A sketch of capacity k that received N increments (e.g., N events for
+absolute frequencies of transitions) guarantees for every key that
+
+- the estimated count of a monitored key overestimates its true count
+  by at most its error, and error <= N / k;
+- the true count of a key that is not monitored is at most the minimal
+  monitored count, which is <= N / k; hence every key with true count
+  > N / k is monitored.
+
+So the transitions and activities with frequencies above N / k (the
+dominant behaviour) are always in the model, and their frequencies are
+overestimated by at most N / k. Case frequencies of transitions and
+activities are counted once per case while the case is open, so a case
+that is evicted while idle and appears again is counted as a new case.
+
+Examples
+--------
+>>> STM = StreamingTransitionMatrix(capacity=1000, idle_timeout=3600)
+>>> for case, activity, timestamp in events:
+...     STM.add(case, activity, timestamp)
+>>> G = Graph()
+>>> G.update(STM.log(), 80, 5, STM.transit_matrix(), STM.node_significance())
+
+References
+----------
+.. [1] Metwally, A., Agrawal, D., & El Abbadi, A. (2005, January).
+       Efficient computation of frequent and top-k elements in data
+       streams. In International conference on database theory
+       (pp. 398-412). Springer, Berlin, Heidelberg.
+"""
+import heapq
+from collections import OrderedDict
+from log import Log
+from transition_matrix import TransitionMatrix
+
+class SpaceSaving(object):
+    """Space-Saving sketch of approximate counts of at most capacity
+    keys. The key with the minimal count is found with a heap, which
+    entries are invalidated lazily: an entry is stale if the count of
+    its key has changed since it was pushed.
+
+    Attributes
+    ----------
+    capacity: int
+        Maximal number of monitored keys
+    counts: dict
+        Estimated counts of monitored keys
+    errors: dict
+        Maximal overestimation of counts of monitored keys
+    total: int
+        Sum of all increments
+    """
+
+    def __init__(self, capacity):
+        """Class Constructor."""
+        if capacity < 1:
+            raise ValueError('Capacity should be positive')
+        self.capacity = capacity
+        self.counts = dict()
+        self.errors = dict()
+        self.total = 0
+        self._heap = []
+        self._order = 0 # breaks ties between keys in the heap
+
+    def _push(self, key):
+        self._order += 1
+        heapq.heappush(self._heap, (self.counts[key], self._order, key))
+        if len(self._heap) > 4 * self.capacity:
+            # Drop stale entries
+            self._heap = [(self.counts[k], i, k) for i, k in
+                          enumerate(self.counts)]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        """Remove the key with the minimal count, return its count."""
+        while True:
+            count, _, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                del self.counts[key]
+                del self.errors[key]
+                return count
+
+    def add(self, key, inc=1):
+        """Increment count of the key."""
+        self.total += inc
+        if key in self.counts:
+            self.counts[key] += inc
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = inc
+            self.errors[key] = 0
+        else:
+            count = self._pop_min()
+            self.counts[key] = count + inc
+            self.errors[key] = count
+        self._push(key)
+
+    def error_bound(self):
+        """Return maximal overestimation of any count (total / capacity)."""
+        return self.total / self.capacity
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def __getitem__(self, key):
+        return self.counts.get(key, 0)
+
+class StreamingTransitionMatrix(TransitionMatrix):
+    """Transition matrix of an event stream in fixed memory (see
+    SpaceSaving for error bounds).
+
+    Attributes
+    ----------
+    T: dict
+        Approximate transition matrix of the monitored transitions
+        (updated by transition_matrix)
+    abs_freq: SpaceSaving
+        Absolute frequencies of transitions
+    case_freq: SpaceSaving
+        Case frequencies of transitions
+    act_freq: SpaceSaving
+        Case frequencies of activities
+    starts: SpaceSaving
+        Frequencies of the first activities of cases
+    ends: SpaceSaving
+        Frequencies of the last activities of closed cases
+    open_cases: OrderedDict
+        Last activity, time of the last event, and sets of transitions
+        and activities of every open case (the least recently active
+        case is the first)
+    case_cnt: int
+        Number of cases (open and closed)
+
+    See Also
+    ---------
+    TransitionMatrix
+    transit_matrix
+    node_significance
+    """
+
+    def __init__(self, capacity=10000, act_capacity=None, max_open_cases=100000,
+                 idle_timeout=None):
+        """Class Constructor.
+
+        Parameters
+        ----------
+        capacity: int
+            Maximal number of monitored transitions (default 10000)
+        act_capacity: int
+            Maximal number of monitored activities, starts and ends
+            (default None, i.e. equal to capacity)
+        max_open_cases: int
+            Maximal number of open cases: if exceeded, the least
+            recently active case is closed (default 100000). It bounds
+            the memory of the sets of transitions and activities of
+            open cases (see Memory bound)
+        idle_timeout: float
+            Case is closed if it has no events during this time
+            (default None, i.e. cases are not closed by time)
+        """
+        self.T = dict()
+        act_capacity = act_capacity or capacity
+        self.abs_freq = SpaceSaving(capacity)
+        self.case_freq = SpaceSaving(capacity)
+        self.act_freq = SpaceSaving(act_capacity)
+        self.starts = SpaceSaving(act_capacity)
+        self.ends = SpaceSaving(act_capacity)
+        self.max_open_cases = max_open_cases
+        self.idle_timeout = idle_timeout
+        self.open_cases = OrderedDict()
+        self.case_cnt = 0
+        self._time = 0
+
+    def add(self, case, activity, timestamp=None):
+        """Add event of the case to the stream. Events should come in
+        the order of timestamps; if timestamp is None, the number of
+        events is used as time."""
+        self._time = self._time + 1 if timestamp is None else timestamp
+        self.evict(self._time)
+        state = self.open_cases.get(case)
+        if state is None:
+            self.case_cnt += 1
+            self.starts.add(activity)
+            state = [activity, self._time, set(), set()]
+            self.open_cases[case] = state
+        else:
+            pair = (state[0], activity)
+            self.abs_freq.add(pair)
+            if pair not in state[2]:
+                state[2].add(pair)
+                self.case_freq.add(pair)
+            state[0], state[1] = activity, self._time
+            self.open_cases.move_to_end(case)
+        if activity not in state[3]:
+            state[3].add(activity)
+            self.act_freq.add(activity)
+        while len(self.open_cases) > self.max_open_cases:
+            self.close_case(next(iter(self.open_cases)))
+
+    def update(self, events):
+        """Add events (case, activity) or (case, activity, timestamp)
+        to the stream."""
+        for event in events:
+            self.add(*event)
+
+    def close_case(self, case):
+        """Close the case: its last activity is counted as an end."""
+        state = self.open_cases.pop(case)
+        self.ends.add(state[0])
+
+    def evict(self, now):
+        """Close the cases idle for more than idle_timeout at time now."""
+        if self.idle_timeout is None:
+            return
+        while self.open_cases:
+            case, state = next(iter(self.open_cases.items()))
+            if now - state[1] <= self.idle_timeout:
+                break
+            self.close_case(case)
+
+    def transition_matrix(self):
+        """Return TransitionMatrix of the monitored transitions."""
+        T = dict()
+        for (a_i, a_j), abs_freq in self.abs_freq.counts.items():
+            if a_i not in T:
+                T[a_i] = dict()
+            case_freq = min(self.case_freq[(a_i, a_j)], abs_freq)
+            T[a_i][a_j] = (abs_freq, max(case_freq, 1))
+        self.T = T
+        TM = TransitionMatrix()
+        TM.T = T
+        return TM
+
+    def transit_matrix(self):
+        """Return transition matrix with 'start' and 'end' nodes (see
+        transit_matrix). Open cases are considered as ending with their
+        last activities."""
+        T = {a_i: dict(row) for a_i, row in self.transition_matrix().T.items()}
+        ends = dict(self.ends.counts)
+        for state in self.open_cases.values():
+            ends[state[0]] = ends.get(state[0], 0) + 1
+        T['start'] = {s: (n, n) for s, n in self.starts.counts.items()}
+        for e, n in ends.items():
+            if e not in T: T[e] = dict()
+            T[e]['end'] = (n, n)
+        # Monitored activities which transitions were not monitored
+        for a in self.act_freq.counts:
+            if a not in T: T[a] = dict()
+        return T
+
+    def node_significance(self):
+        """Return node significance, i.e. activities case frequencies
+        (see node_significance)."""
+        return {a: min(n, self.case_cnt) / self.case_cnt
+                for a, n in self.act_freq.counts.items()}
+
+    def log(self):
+        """Return Log with the number of cases and the monitored
+        activities of the stream (flat_log is empty)."""
+        log = Log()
+        log.cases = range(self.case_cnt)
+        log.activities = set(self.act_freq.counts)
+        return log
@@ -1,5 +1,17 @@
+import numpy as np
 from observer_abc import Observer
 
+QUANTILES = (0.25, 0.5, 0.75)
+
+def _group_quantiles(values, starts, counts, q):
+    """Return q-quantiles (linear interpolation) of sorted groups of
+    values, where the i-th group is values[starts[i]:starts[i]+counts[i]]."""
+    pos = starts + q * np.maximum(counts - 1, 0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + np.maximum(counts - 1, 0))
+    frac = pos - lo
+    return values[lo] * (1 - frac) + values[hi] * frac
+
 class TransitionMatrix(Observer):
     """Class to represent a transition matrix that 
     describes the transitions of a Markov chain.
@@ -7,9 +19,12 @@ class TransitionMatrix(Observer):
 
     def __init__(self):
         """"Transition matrix is represented in the T attribute
-        (default empty dictionary).
+        (default empty dictionary). Durations of transitions are
+        represented in the durations attribute (see update_encoded).
         """
         self.T = dict()
+        self.durations = dict()
+        self.time_unit = None
 
     def update(self, log):
         """Transition matrix as dictionary indicating relations 
@@ -38,3 +53,72 @@ class TransitionMatrix(Observer):
                 T[a_i][a_j] = tuple(T[a_i][a_j])
         
         self.T = T
+        self.durations = dict()
+        self.time_unit = None
+
+    def update_encoded(self, log):
+        """Transition matrix (see update) of the encoded log (see
+        Log.codes) computed in one vectorized pass. If the log has
+        timestamps, durations of transitions are computed in the same
+        pass: the number of transitions with known duration, mean,
+        and QUANTILES (median is 0.5-quantile) as a dictionary
+        durations[a_i][a_j] = {'count': ..., 'mean': ..., 0.5: ...}.
+        Durations are in seconds for dates (time_unit is 's') and in
+        the units of timestamps for numbers (time_unit is None).
+        """
+        log = log._ensure_encoded()
+        codes, offsets, labels = log.codes, log.offsets, log.labels
+        L = len(labels)
+        case = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        pairs = np.flatnonzero(case[:-1] == case[1:])
+        keys = codes[pairs].astype(np.int64) * L + codes[pairs + 1]
+        # Stable sort keeps the order of cases within every transition
+        s = np.argsort(keys, kind='stable')
+        keys_s, case_s = keys[s], case[pairs][s]
+        new = np.ones(len(s), dtype=bool)
+        new[1:] = keys_s[1:] != keys_s[:-1]
+        starts = np.flatnonzero(new)
+        uniq, first = keys_s[starts], s[starts]
+        abs_freq = np.diff(np.append(starts, len(s)))
+        K = len(uniq)
+        inv = np.empty(len(s), dtype=np.int64)
+        inv[s] = np.cumsum(new) - 1
+        new[1:] |= case_s[1:] != case_s[:-1]
+        case_freq = np.bincount(inv[s][new], minlength=K)
+        # Transitions are ordered by their first occurrence (as in update)
+        order = np.argsort(first, kind='stable').tolist()
+        T = dict()
+        for i in order:
+            a_i, a_j = labels[uniq[i] // L], labels[uniq[i] % L]
+            if a_i not in T:
+                T[a_i] = dict()
+            T[a_i][a_j] = (int(abs_freq[i]), int(case_freq[i]))
+        self.T = T
+        self.durations = dict()
+        self.time_unit = None
+        timestamps = log.timestamps
+        if (timestamps is None) or (K == 0):
+            return
+        if timestamps.dtype.kind == 'M':
+            d = (timestamps[pairs + 1] - timestamps[pairs]) \
+                / np.timedelta64(1, 's')
+            self.time_unit = 's'
+        else:
+            d = (timestamps[pairs + 1] - timestamps[pairs]).astype(float)
+        known = ~np.isnan(d)
+        count = np.bincount(inv, known, K).astype(np.int64)
+        total = np.bincount(inv, np.where(known, d, 0), K)
+        # Durations sorted within transitions (unknown ones are the last)
+        order_d = np.argsort(d)
+        d = d[order_d[np.argsort(inv[order_d], kind='stable')]]
+        stats = {'count': count,
+                 'mean': total / np.maximum(count, 1)}
+        for q in QUANTILES:
+            stats[q] = _group_quantiles(d, starts, count, q)
+        for i in order:
+            if count[i] == 0: continue
+            a_i, a_j = labels[uniq[i] // L], labels[uniq[i] % L]
+            if a_i not in self.durations:
+                self.durations[a_i] = dict()
+            self.durations[a_i][a_j] = {k: v[i].item()
+                                        for k, v in stats.items()}
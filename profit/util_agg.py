@@ -33,6 +33,13 @@ def reconstruct_log(log, meta_states, ordered=False):
     
     return new_log
 
+def significant_states(cycles, case_cnt, cycle_rel=0.5):
+    """Return cycles that occur more than in cycle_rel of cases,
+    i.e. meta states (see Graph.find_cycles).
+    """
+    return [c for c, (abs_freq, case_freq) in cycles.items()
+            if len(c) > 1 and case_freq / case_cnt >= cycle_rel]
+
 def check_dict_key(d, key, set_val):
     if key not in d:
         d[key] = set_val
@@ -1,3 +1,5 @@
+import numpy as np
+
 def incidence_matrix(edges, excpt=[]):
     """Return an incidence matrix as dict where 1 indicates
     a relationship between two nodes in a directed graph.
@@ -58,8 +60,10 @@ def dict_normalization(dict_, nested=False):
 
 def node_significance(log):
     """Return node significance, i.e. activities case frequencies."""
-    caseF = {a: sum(a in case_log for case_log in log.flat_log.values())
-             for a in log.activities}
+    caseF = dict.fromkeys(log.activities, 0)
+    for case_log in log.flat_log.values():
+        for a in set(case_log):
+            caseF[a] += 1
     # Activities (node) significance
     S = {a: caseF[a] / len(log.cases) for a in caseF}
     return S
@@ -80,28 +84,112 @@ def transit_matrix(log, T):
         T[e]['end'] = (process_end[e],process_end[e])
     return T
 
+class _ADSRow(dict):
+    """Row of ADS matrix, where missing transitions are never (N)."""
+    def __missing__(self, key):
+        return 'N'
+
+class _ADSMatrix(dict):
+    """Sparse ADS matrix, where missing rows have never (N) transitions."""
+    def __missing__(self, key):
+        return _ADSRow()
+
 def ADS_matrix(log, T):
     """Return a matrix that represents whether events in the log 
     actually always (A), never (N), or sometimes (S) followed each 
     other.
+
+    The matrix is sparse: only the transitions observed in the log
+    are stored, the others are never (N) followed each other.
     """
     case_cnt = len(log.cases)
     T = transit_matrix(log, T)
-    activities = log.activities
-    ADS = dict()
-    for v1 in list(activities) + ['start']:
-        ADS[v1] = dict()
-        for v2 in list(activities) + ['end']:
-            try: f_rel = T[v1][v2][1]
-            except: f_rel = -1
+    ADS = _ADSMatrix()
+    for v1 in T:
+        ADS[v1] = _ADSRow()
+        for v2 in T[v1]:
+            f_rel = T[v1][v2][1]
             if f_rel == case_cnt:
                 ADS[v1][v2] = 'A' # always
             elif f_rel > 0:
                 ADS[v1][v2] = 'S' # sometimes
-            elif f_rel == -1:
-                ADS[v1][v2] = 'N' # never
     return ADS
 
+def expand_edges(edges):
+    """Return a set of edges between activities, where edges
+    incident to meta states (tuples) are replaced with edges to
+    every activity of the meta state and with the cycle edges
+    inside it.
+    """
+    edges1 = []
+    for e in edges:
+        if (type(e[0]) == tuple) & (type(e[1]) == tuple):
+            for e_i in e[0]:
+                for e_j in e[1]:
+                    edges1.append((e_i,e_j))
+            edges1 += [(e[0][i], e[0][i+1]) for i in range(len(e[0]) - 1)]
+            edges1 += [(e[1][i], e[1][i+1]) for i in range(len(e[1]) - 1)]
+            edges1 += [(e[0][-1], e[0][0]), (e[1][-1], e[1][0])]
+        elif type(e[0]) == tuple:
+            for e_i in e[0]:
+                edges1.append((e_i,e[1]))
+            edges1 += [(e[0][i], e[0][i+1]) for i in range(len(e[0]) - 1)]
+            edges1 += [(e[0][-1], e[0][0])]
+        elif type(e[1]) == tuple:
+            for e_j in e[1]:
+                edges1.append((e[0], e_j))
+            edges1 += [(e[1][i], e[1][i+1]) for i in range(len(e[1]) - 1)]
+            edges1 += [(e[1][-1], e[1][0])]
+        else:
+            edges1.append(e)
+    return set(edges1)
+
+def rate_breakpoints(values):
+    """Return the least rates (in [0, 100]) at which every value
+    clears the threshold 1 - rate / 100, i.e. the rates at which
+    the filtering result may change, including 0 and 100.
+    """
+    rates = {0, 100}
+    for v in set(values):
+        if (v <= 0) | (v > 1):
+            continue
+        r = 100 * (1 - v)
+        # Compensate rounding error of the threshold computation
+        while 1 - r / 100 > v:
+            r = float(np.nextafter(r, 101))
+        rates.add(min(r, 100))
+    return sorted(rates)
+
+def pareto_front(evaluations, strict=True):
+    """Return non-dominated points ordered by the first objective.
+
+    Parameters
+    ----------
+    evaluations: dict
+        Points as keys and tuples of objectives to minimize as values
+        (only the first two objectives are considered)
+    strict: bool
+        If True, a point is dominated if the other point is not worse
+        in both objectives and better in one; else, if the other point
+        is better in both objectives, and points with the same
+        objectives are all kept (default True)
+    """
+    front = dict()
+    best = None # the least second objective among all previous points
+    best_less = None # ... among points with less first objective
+    prev_f1 = None
+    for x in sorted(evaluations, key=lambda x: evaluations[x][:2]):
+        f1, f2 = evaluations[x][:2]
+        if f1 != prev_f1:
+            best_less, prev_f1 = best, f1
+        if strict:
+            if (best is None) or (f2 < best):
+                front[x] = evaluations[x]
+        elif (best_less is None) or (f2 <= best_less):
+            front[x] = evaluations[x]
+        best = f2 if best is None else min(best, f2)
+    return front
+
 def edge_sig(T, source=[], target=[], type_='out'):
     """Return edge significance, i.e. transitions case frequencies.
     
@@ -120,6 +208,7 @@ def edge_sig(T, source=[], target=[], type_='out'):
         to filtrate (default 'out')
     """
     case_cnt = sum([v[0] for v in T['start'].values()])
+    target = set(target)
     S = dict()
     for a_i in source:
         S[a_i] = dict()
@@ -193,53 +282,61 @@ def edge_filtering(S, edge_list, co=0, type_='out'):
         to filtrate (default 'out')
     """
     edges = edge_list[:]
+    edges_set = set(edges)
     for a in S:
         S_sort = sorted(S[a], key=S[a].get, reverse=True)
         for i in range(len(S[a])):
             b = S_sort[i]
             if (S[a][b] >= co) | (i == 0):
-                if type_ != 'out':
-                    if (b,a) not in edges: edges.append((b,a))
-                else:
-                    if (a,b) not in edges: edges.append((a,b))
+                e = (b,a) if type_ != 'out' else (a,b)
+                if e not in edges_set:
+                    edges.append(e)
+                    edges_set.add(e)
             else: break
     return edges
 
 def check_feasibility(nodes, edges, T, I, S, S_out):
-    """Perform two DFS types to check conditions."""
-    # 1. All nodes are end ancestors
-    def isAncestor(start, node):
-        marked[node] = True
-        try: successors = I[node]
-        except: successors = []
-        if 'end' in successors:
-            end_ancestor[start] = True
-        if not end_ancestor[start]:
-            for successor in successors:
-                if not marked[successor]:
-                    isAncestor(start, successor)
+    """Perform two graph traversals to check conditions."""
+    # 1. All nodes are end ancestors, i.e. they are reached from
+    # the end by inverse edges
+    def end_ancestors():
+        predecessors = dict()
+        for a_i in I:
+            for a_j in I[a_i]:
+                predecessors.setdefault(a_j, []).append(a_i)
+        reached, stack = {'end'}, ['end']
+        while stack:
+            for predecessor in predecessors.get(stack.pop(), []):
+                if predecessor not in reached:
+                    reached.add(predecessor)
+                    stack.append(predecessor)
+        return {v: v in reached for v in nodes}
 
     # 2. All nodes are start descendants
-    def isDescendant(node):
-        start_descendant[node] = True
-        try: successors = I[node]
-        except: successors = []
-        for successor in successors:
-            if successor != 'end' and start_descendant[successor] == False:
-                isDescendant(successor)
+    def start_descendants():
+        reached, stack = {'start'}, ['start']
+        while stack:
+            for successor in I.get(stack.pop(), []):
+                if (successor != 'end') and (successor not in reached):
+                    reached.add(successor)
+                    stack.append(successor)
+        state = {v: v in reached for v in nodes}
+        state['start'] = True
+        return state
     
     # Find extra edges if condition fails.
     def make_connected(edges, state, check_cond='desc'):
         component_nodes = [k for k, v in state.items() if v == False]
         directed_nodes = [k for k, v in state.items() if v == True]
         source = directed_nodes if check_cond == 'desc' else component_nodes
-        target = component_nodes if check_cond == 'desc' else directed_nodes
+        target = set(component_nodes if check_cond == 'desc' else directed_nodes)
         extra_edges = dict()
         for node in source:
             for a in T[node]:
                 if a in target:
                     extra_edges[(node, a)] = S_out[node][a]
         if len(extra_edges) == 0:
+            component_nodes = set(component_nodes)
             S_comp = {k: v for k, v in S.items() if k in component_nodes}
             if check_cond == 'desc':
                 edges.append(('start', max(S_comp, key=S_comp.get)))
@@ -259,15 +356,11 @@ def check_feasibility(nodes, edges, T, I, S, S_out):
             I[extra_edge[0]][extra_edge[1]] = 1
 
     while True:
-        end_ancestor = dict.fromkeys(nodes, False)
-        for v in nodes:
-            marked = dict.fromkeys(nodes, False)
-            isAncestor(v, v)
+        end_ancestor = end_ancestors()
         if all(end_ancestor.values()): break
         else: make_connected(edges, end_ancestor, 'anc')
 
     while True:
-        start_descendant = dict.fromkeys(nodes, False)
-        isDescendant('start')
+        start_descendant = start_descendants()
         if all(start_descendant.values()): break
         else: make_connected(edges, start_descendant, 'desc')
@@ -0,0 +1,20 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'profit')]
+
+LOG_PATH = os.path.join(ROOT, 'demo', 'log_examples', 'remote_monitoring_eng.csv')
+
+def read_log(cols=(0, 1, 2)):
+    """Return the demo log (remote monitoring)."""
+    from log import Log
+    log = Log()
+    log.update(FILE_PATH=LOG_PATH, cols=cols, encoding='cp1251')
+    return log
+
+@pytest.fixture(scope='session')
+def log():
+    """Demo log shared by tests (should not be changed)."""
+    return read_log()
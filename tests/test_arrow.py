@@ -0,0 +1,56 @@
+import pytest
+from conftest import LOG_PATH
+
+pd = pytest.importorskip('pandas')
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from log import Log
+from process_map import ProcessMap
+
+DROPPED = 'Yellow zone (doctor)'
+
+@pytest.fixture(scope='module')
+def table():
+    df = pd.read_csv(LOG_PATH, encoding='cp1251')
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def test_parquet_same_as_csv(table, log, tmp_path):
+    path = str(tmp_path / 'log.parquet')
+    pq.write_table(table, path, row_group_size=500)
+    log_pq = Log()
+    log_pq.update(FILE_PATH=path, cols=('case_id', 'task', 'timestamp'))
+    assert log_pq.flat_log == log.flat_log
+    assert log_pq.activities == log.activities
+
+def test_filtered_activity_is_removed(table, tmp_path):
+    path = str(tmp_path / 'log.parquet')
+    pq.write_table(table, path)
+    log_pq = Log()
+    log_pq.update(FILE_PATH=path, cols=(0, 1, 2), filters=[('task', '!=', DROPPED)])
+    assert DROPPED not in log_pq.activities
+    assert log_pq.activities == {a for t in log_pq.flat_log.values() for a in t}
+    pm = ProcessMap()
+    pm.set_log(log_pq)
+    pm.set_params(optimize=False)
+    pm.update()
+    assert DROPPED not in pm.get_model().nodes
+
+def test_dataset_directory(table, log, tmp_path):
+    pq.write_to_dataset(table, str(tmp_path / 'dataset'))
+    log_ds = Log()
+    log_ds.update(FILE_PATH=str(tmp_path / 'dataset'), cols=(0, 1, 2))
+    assert log_ds.flat_log == log.flat_log
+
+def test_feather_reads_used_columns_and_filters(table, log, tmp_path):
+    feather = pytest.importorskip('pyarrow.feather')
+    path = str(tmp_path / 'log.feather')
+    zone = pa.array(['red' if 'Red' in a else 'other'
+                     for a in table.column(1).to_pylist()])
+    feather.write_feather(table.append_column('zone', zone), path)
+    log_ft = Log()
+    log_ft.update(FILE_PATH=path, cols=(0, 1, 2), filters=[('zone', '=', 'red')])
+    traces = {c: tuple(a for a in t if 'Red' in a) for c, t in log.flat_log.items()}
+    assert log_ft.flat_log == {c: t for c, t in traces.items() if t}
+    with pytest.raises(TypeError):
+        Log().update(FILE_PATH=path, cols=(0, 1), no_such_argument=True)
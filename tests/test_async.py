@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from process_map import ProcessMap
+
+def test_cancel_does_not_change_params(log):
+    pm = ProcessMap()
+    pm.set_log(log)
+    user_cancel = threading.Event()
+    pm.set_params(step=5, cancel=user_cancel)
+    executor = ThreadPoolExecutor(1)
+
+    async def run():
+        started = threading.Event()
+        # Cancel the task after the first evaluated model
+        pm.set_params(callback=lambda status: started.set())
+        task = asyncio.ensure_future(pm.update_async(executor))
+        await asyncio.to_thread(started.wait)
+        task.cancel()
+        try: await task
+        except asyncio.CancelledError: pass
+
+    asyncio.run(run())
+    executor.shutdown(wait=True)
+    status = pm.get_optimization()
+    assert not status['finished']
+    assert status['points'] < status['total']
+    assert pm.get_params()['cancel'] is user_cancel
+    assert not user_cancel.is_set()
+
+    # The next update with the same parameters is not cancelled
+    pm.set_params(callback=None)
+    pm.update()
+    assert pm.get_optimization()['finished']
+
+def test_user_event_stops_async_update(log):
+    pm = ProcessMap()
+    pm.set_log(log)
+    user_cancel = threading.Event()
+    user_cancel.set()
+    pm.set_params(cancel=user_cancel)
+    asyncio.run(pm.update_async())
+    assert not pm.get_optimization()['finished']
@@ -0,0 +1,17 @@
+import copy
+from cache import DiscoveryCache
+from graph import Graph
+from transition_matrix import TransitionMatrix
+
+def test_cached_optimization_resets_prepared_edges(log, tmp_path):
+    cache = DiscoveryCache(str(tmp_path))
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    G = Graph()
+    rates = G.optimize(log, copy.deepcopy(TM), 0.5, 50, cache=cache)
+    assert G._prepared is not None
+    nodes, edges = G.nodes, G.edges
+    assert G.optimize(log, copy.deepcopy(TM), 0.5, 50, cache=cache) == rates
+    assert G.optimization['cached']
+    assert G._prepared is None
+    assert (G.nodes, G.edges) == (nodes, edges)
@@ -0,0 +1,35 @@
+import pickle
+import pytest
+from graph import Graph
+from transition_matrix import TransitionMatrix
+
+@pytest.fixture(scope='module')
+def fitted(log):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    G = Graph()
+    G.update(log, 60, 30, TM)
+    return G, TM
+
+def test_compiled_model_same_as_fitness(log, fitted):
+    G, TM = fitted
+    model = G.compile(log, TM)
+    assert model.fitness(log) == pytest.approx(G.fitness(log, TM.T))
+    scores = model.score(log)
+    assert list(scores['cases']) == list(log.flat_log)
+    for case, deviations in list(zip(scores['cases'], scores['deviations']))[:20]:
+        assert deviations == len(model.missing_transitions(log.flat_log[case]))
+
+def test_compiled_model_is_immutable(log, fitted):
+    G, TM = fitted
+    model = G.compile(log, TM)
+    for m in [model, pickle.loads(pickle.dumps(model))]:
+        with pytest.raises(ValueError):
+            m._loss_vals[:] = 0
+        with pytest.raises(ValueError):
+            m._edge_keys[0] = 0
+        with pytest.raises(TypeError):
+            m._index['start'] = 1
+        with pytest.raises(AttributeError):
+            m.edges = frozenset()
+        assert m.fitness(log) == pytest.approx(G.fitness(log, TM.T))
@@ -0,0 +1,63 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from transition_matrix import TransitionMatrix
+from process_map import ProcessMap
+from discovery import PARAMS, discover
+
+SETTINGS = [({'activities': a, 'paths': p}, {'optimize': False})
+            for a in [40, 80, 100] for p in [0, 30, 100]] + \
+           [(None, {'step': 25}),
+            (None, {'step': 50, 'lambd': 0.2}),
+            ({'activities': 80, 'paths': 30},
+             {'optimize': False, 'aggregate': True, 'cycle_rel': 0.3})]
+
+@pytest.fixture
+def TM(log):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    return TM
+
+def test_concurrent_same_as_serial(log, TM):
+    flat_log, T = copy.deepcopy(dict(log.flat_log)), copy.deepcopy(TM.T)
+    serial = [discover(log, rates, params, TM) for rates, params in SETTINGS]
+    with ThreadPoolExecutor(8) as executor:
+        for _ in range(2):
+            models = list(executor.map(lambda s: discover(log, s[0], s[1], TM),
+                                       SETTINGS))
+            assert models == serial
+            assert [m.rates for m in models] == [m.rates for m in serial]
+    assert dict(log.flat_log) == flat_log
+    assert TM.T == T
+    assert 'start' not in TM.T
+
+def test_same_as_process_map(log):
+    for rates, params in SETTINGS[-3:]:
+        pm = ProcessMap()
+        pm.set_log(log)
+        if rates:
+            pm.set_rates(rates['activities'], rates['paths'])
+        pm.set_params(**params)
+        pm.update()
+        model = discover(log, rates, params)
+        assert model == pm.get_model()
+        assert model.rates == (pm.get_rates()['activities'],
+                               pm.get_rates()['paths'])
+
+def test_joint_optimization_keeps_cycle_rel(log):
+    params = {'aggregate': True, 'joint': True, 'step': [50, 100],
+              'cycle_rels': [0.2, 0.5]}
+    model = discover(log, None, params)
+    a, p, cycle_rel = model.rates
+    assert cycle_rel in params['cycle_rels']
+    again = discover(log, {'activities': a, 'paths': p},
+                     {'optimize': False, 'aggregate': True,
+                      'cycle_rel': cycle_rel})
+    assert again == model
+
+def test_process_map_defaults_shared():
+    pm = ProcessMap()
+    assert {p: pm.Params[p] for p in PARAMS} == PARAMS
+    assert pm.Params['cycle_rels'] is not PARAMS['cycle_rels']
+    with pytest.raises(ValueError):
+        discover(None, None, {'render_format': 'svg'})
@@ -0,0 +1,36 @@
+import pytest
+from graph import Graph
+from transition_matrix import TransitionMatrix
+from features import case_features
+
+@pytest.fixture(scope='module')
+def fitted(log):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    G = Graph()
+    G.update(log, 60, 30, TM)
+    return G, TM
+
+@pytest.mark.parametrize('sparse', [True, False])
+def test_case_features_same_as_naive_loop(log, fitted, sparse):
+    G, TM = fitted
+    X, names, cases = case_features(log, G, TM, sparse=sparse)
+    X = X.toarray() if sparse else X
+    col = {name: j for j, name in enumerate(names)}
+    assert cases == list(log.flat_log)
+    for i, case in list(enumerate(cases))[::25]:
+        trace = ['start'] + list(log.flat_log[case]) + ['end']
+        pairs = list(zip(trace, trace[1:]))
+        for pair in set(pairs):
+            assert X[i, col[('transition', pair)]] == pairs.count(pair)
+        assert X[i, :-3].sum() == len(pairs)
+        deviations = len([e for e in pairs if e not in G.edges])
+        assert X[i, col[('conformance', 'deviations')]] == deviations
+        assert X[i, col[('conformance', 'fits')]] == (deviations == 0)
+
+def test_case_conformance_same_as_score(log, fitted):
+    G, TM = fitted
+    X, names, _ = case_features(log, G, TM, sparse=False)
+    scores = G.compile(log, TM).score(log)
+    assert X[:, names.index(('conformance', 'loss'))] == \
+           pytest.approx(scores['loss'])
@@ -0,0 +1,140 @@
+import copy
+import pytest
+from graph import Graph
+from transition_matrix import TransitionMatrix
+from util_pm import ADS_matrix, transit_matrix
+
+@pytest.fixture
+def TM(log):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    return TM
+
+def test_aggregation_sweep_same_as_per_setting(log, TM):
+    G = Graph()
+    G.update(log, 80, 40, TM)
+    model = (G.nodes, G.edges)
+    results = G.aggregate_sweep(log, 80, 40, [0.1, 0.3, 0.5, 1.0],
+                                ('outer', 'inner'), ('all', 'frequent'))
+    assert (G.nodes, G.edges) == model
+    assert len(results) == 16
+    for (cycle_rel, agg_type, heuristic), result in results.items():
+        S = Graph()
+        S.update(log, 80, 40, TM)
+        S.aggregate(log, 80, 40, agg_type, heuristic, cycle_rel=cycle_rel)
+        assert result == (S.nodes, S.edges), (cycle_rel, agg_type, heuristic)
+
+def test_joint_optimization_same_as_brute_force(log, TM):
+    grid, cycle_rels = [0, 50, 100], [0.2, 0.5, 1.0]
+    G = Graph()
+    rates = G.optimize_joint(log, copy.deepcopy(TM), 0.5, grid, cycle_rels)
+    T = copy.deepcopy(TM)
+    transit_matrix(log, T.T)
+    ADS = ADS_matrix(log, T.T)
+    B = Graph()
+    values, models = dict(), dict()
+    for a in grid:
+        for p in grid:
+            for cycle_rel in cycle_rels:
+                B.update(log, a, p, T)
+                B.aggregate(log, a, p, cycle_rel=cycle_rel)
+                values[(a, p, cycle_rel)] = (B.fitness(log, T.T, ADS),
+                                             len(B.edges) / (len(B.nodes) + 2))
+                models[(a, p, cycle_rel)] = (B.nodes, B.edges)
+    B.update(log, 0, 0, T)
+    max_loss = B.fitness(log, T.T, ADS)
+    B.update(log, 100, 100, T)
+    max_compl = len(B.edges) / (len(B.nodes) + 2)
+    Q = {theta: 0.5 * v[0] / max_loss + 0.5 * v[1] / max_compl
+         for theta, v in values.items()}
+    theta = min(Q, key=Q.get)
+    assert (rates['activities'], rates['paths'], rates['cycle_rel']) == theta
+    assert (G.nodes, G.edges) == models[theta]
+
+@pytest.mark.parametrize('lambd', [0.1, 0.3, 0.7, 0.9])
+def test_reoptimize_same_as_fresh_optimize(log, TM, lambd):
+    G = Graph()
+    G.optimize(log, copy.deepcopy(TM), 0.5, 20)
+    rates = G.reoptimize(lambd)
+    fresh = Graph()
+    assert fresh.optimize(log, copy.deepcopy(TM), lambd, 20) == rates
+    assert (G.nodes, G.edges) == (fresh.nodes, fresh.edges)
+
+def quality(G, lambd):
+    """Return the optimal quality value of the last optimization."""
+    max_loss, max_compl = G._scale
+    return min((1 - lambd) * v[0] / max_loss + lambd * v[1] / max_compl
+               for v in G.evaluations.values())
+
+def test_exact_optimization_not_worse_than_grid(log, TM):
+    grid, exact = Graph(), Graph()
+    grid.optimize(log, copy.deepcopy(TM), 0.5, 10)
+    exact.optimize(log, copy.deepcopy(TM), 0.5, 'exact')
+    assert grid._scale == exact._scale
+    assert quality(exact, 0.5) <= quality(grid, 0.5)
+    # Every distinct model is evaluated once
+    thetas = exact.rate_breakpoints(log, TM)
+    G, models = Graph(), set()
+    for a, p in thetas:
+        if (G._prepared is None) or (G._prepared['activity_rate'] != a):
+            G.prepare(log, a, TM)
+        G.update_paths(p)
+        models.add(frozenset(G.edges))
+    assert exact.optimization['evaluations'] == len(models)
+    assert set(exact.evaluations) == set(thetas)
+
+def test_update_paths_same_as_update(log, TM):
+    rates = [0, 5, 10, 25, 33.3, 50, 66.7, 75, 90, 95, 100]
+    G, P = Graph(), Graph()
+    for a in rates:
+        P.prepare(log, a, TM)
+        for p in rates:
+            G.update(log, a, p, TM)
+            P.update_paths(p)
+            assert (P.nodes, P.edges) == (G.nodes, G.edges), (a, p)
+
+def dense_ADS(log, T):
+    """ADS matrix over all pairs of nodes (as before it was sparse)."""
+    T = transit_matrix(log, copy.deepcopy(T))
+    case_cnt = len(log.cases)
+    nodes = list(log.activities) + ['start', 'end']
+    ADS = dict()
+    for v1 in nodes:
+        ADS[v1] = dict()
+        for v2 in nodes:
+            f_rel = T.get(v1, dict()).get(v2, (0, 0))[1]
+            ADS[v1][v2] = 'A' if f_rel == case_cnt else \
+                          'S' if f_rel > 0 else 'N'
+    return ADS
+
+def test_sparse_ADS_same_as_dense(log, TM):
+    ADS, dense = ADS_matrix(log, copy.deepcopy(TM.T)), dense_ADS(log, TM.T)
+    assert len(ADS) < len(dense) ** 2
+    for v1 in dense:
+        for v2 in dense[v1]:
+            assert ADS[v1][v2] == dense[v1][v2], (v1, v2)
+    assert ADS['no such activity']['end'] == 'N'
+    G = Graph()
+    for rates in [(0, 0), (50, 20), (100, 100)]:
+        G.update(log, *rates, TM)
+        assert G.fitness(log, TM.T, ADS) == G.fitness(log, TM.T, dense)
+
+def test_max_evals_stops_optimization(log, TM):
+    G = Graph()
+    rates = G.optimize(log, copy.deepcopy(TM), 0.5, 10, max_evals=10)
+    status = G.optimization
+    assert not status['finished']
+    assert status['points'] < status['total'] == 121
+    assert 10 <= status['evaluations'] < 62
+    assert rates in [{'activities': a, 'paths': p} for a, p in G.evaluations]
+
+def test_callback_sees_increasing_points(log, TM):
+    statuses = []
+    G = Graph()
+    G.optimize(log, copy.deepcopy(TM), 0.5, 20, callback=statuses.append)
+    points = [s['points'] for s in statuses]
+    assert points == sorted(set(points))
+    assert points[-1] == statuses[-1]['total'] == 36
+    assert statuses[-1]['finished']
+    assert not any(s['finished'] for s in statuses[:-1])
+    assert statuses[-1]['evaluations'] == G.optimization['evaluations']
@@ -0,0 +1,95 @@
+from collections import Counter
+import pytest
+from log import Log
+from process_map import ProcessMap
+
+CSV = """case,activity,time
+2,c,2021-01-01 10:00
+1,b,2021-01-01 09:00
+1,a,2021-01-01 08:00
+2,a,2021-01-01 09:30
+1,d,2021-01-01 09:00
+2,b,2021-01-01 09:30
+1,c,2021-01-01 09:00
+"""
+
+def read_csv(tmp_path, cols):
+    path = tmp_path / 'log.csv'
+    path.write_text(CSV)
+    log = Log()
+    log.update(FILE_PATH=str(path), cols=cols)
+    return log
+
+def test_events_ordered_by_time_with_stable_ties(tmp_path):
+    log = read_csv(tmp_path, (0, 1, 2))
+    # Events with equal timestamps keep their order in the file
+    assert log.flat_log == {1: ('a', 'b', 'd', 'c'), 2: ('a', 'b', 'c')}
+    for i in range(len(log.case_ids)):
+        times = list(log.timestamps[log.offsets[i]:log.offsets[i+1]])
+        assert times == sorted(times)
+    assert log.cases == {1, 2}
+    assert log.activities == {'a', 'b', 'c', 'd'}
+
+def test_file_order_kept_without_timestamps(tmp_path):
+    log = read_csv(tmp_path, (0, 1))
+    assert log.flat_log == {1: ('b', 'a', 'd', 'c'), 2: ('c', 'a', 'b')}
+    assert log.timestamps is None
+
+def materialize(view):
+    """Return Log with the traces of the view."""
+    log = Log()
+    log.flat_log = dict(view.flat_log)
+    log.cases = set(log.flat_log)
+    log.activities = {a for t in log.flat_log.values() for a in t}
+    return log
+
+def discover(log):
+    pm = ProcessMap()
+    pm.set_log(log)
+    pm.set_params(optimize=False)
+    pm.set_rates(80, 30)
+    pm.update()
+    return pm.get_model()
+
+def view_filters(log):
+    cases = log.case_ids[::3]
+    activities = sorted(log.activities)[:12]
+    middle = log.timestamps[len(log.timestamps) // 2]
+    return {
+        'cases': lambda l: l.filter_cases(cases),
+        'time': lambda l: l.filter_time(start=middle),
+        'time_contained': lambda l: l.filter_time(end=middle, how='contained'),
+        'activities': lambda l: l.filter_activities(activities),
+        'variants': lambda l: l.top_variants(5),
+        'chained': lambda l: l.filter_time(start=middle)
+                              .filter_activities(activities).top_variants(3),
+        'variants_of_activities': lambda l: l.filter_activities(activities)
+                                             .top_variants(4)
+                                             .filter_cases(cases),
+    }
+
+@pytest.mark.parametrize('name', ['cases', 'time', 'time_contained', 'activities',
+                                  'variants', 'chained', 'variants_of_activities'])
+def test_view_same_as_materialized_log(log, name):
+    view = view_filters(log)[name](log)
+    materialized = materialize(view)
+    assert 0 < len(materialized.flat_log)
+    assert materialized.flat_log != log.flat_log
+    assert view.cases == materialized.cases
+    assert view.activities == materialized.activities
+    assert view.case_ids == list(materialized.flat_log)
+    assert discover(view) == discover(materialized)
+
+def test_top_variants_of_masked_view(log):
+    activities = sorted(log.activities)[:12]
+    view = log.filter_activities(activities)
+    top = view.top_variants(3)
+    counts = Counter(view.flat_log.values())
+    expected = {t for t, _ in counts.most_common(3)}
+    assert set(top.flat_log.values()) == expected
+    assert len(top.flat_log) == sum(counts[t] for t in expected)
+
+def test_view_arrays_are_cached(log):
+    view = log.filter_activities(sorted(log.activities)[:12])
+    assert view.codes is view.codes
+    assert view.case_ids is view.case_ids
@@ -0,0 +1,74 @@
+import pickle
+import pytest
+from graph import Graph
+from model import Model
+from transition_matrix import TransitionMatrix
+
+@pytest.fixture(scope='module')
+def graph(log):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    return Graph(), TM
+
+@pytest.mark.parametrize('aggregate', [False, True])
+def test_freeze_same_as_graph(log, graph, aggregate):
+    G, TM = graph
+    G.update(log, 80, 30, TM)
+    if aggregate:
+        G.aggregate(log, 80, 30, cycle_rel=0.3)
+        assert any(type(v) == tuple for v in G.nodes)
+    model = G.freeze((80, 30))
+    assert model.nodes == G.nodes
+    assert model.edges == G.edges
+    assert model.rates == (80, 30)
+
+def test_models_share_codebook(log, graph):
+    G, TM = graph
+    models = []
+    for p in [0, 50, 100]:
+        G.update(log, 100, p, TM)
+        models.append(G.freeze((100, p)))
+    # The codebook is extended by later models, not copied
+    for a, b in zip(models, models[1:]):
+        assert b.codebook[:len(a.codebook)] == a.codebook
+    assert len(set(models)) == 3
+
+def test_pickle_round_trip(log, graph):
+    G, TM = graph
+    G.update(log, 80, 30, TM)
+    G.aggregate(log, 80, 30, cycle_rel=0.3)
+    model = G.freeze((80, 30))
+    restored = pickle.loads(pickle.dumps(model))
+    assert restored == model
+    assert hash(restored) == hash(model)
+    assert (restored.nodes, restored.edges) == (model.nodes, model.edges)
+    assert restored.rates == model.rates
+    assert restored.codebook == model.codebook
+
+def test_hash_and_eq_ignore_order_and_codebook():
+    nodes = {'a': (3, 2), 'b': (1, 1)}
+    edges = {('start', 'a'): (2, 2), ('a', 'b'): (1, 1), ('b', 'end'): (1, 1)}
+    model = Model(nodes, edges)
+    other = Model(dict(reversed(list(nodes.items()))),
+                  dict(reversed(list(edges.items()))),
+                  codebook=('end', 'x', 'b'), rates=(10, 20))
+    assert other == model
+    assert hash(other) == hash(model)
+    changed = Model(nodes, {**edges, ('a', 'end'): (1, 1)})
+    assert changed != model
+    assert Model({'a': (3, 1), 'b': (1, 1)}, edges) != model
+    assert model != (nodes, edges)
+
+def test_model_is_read_only():
+    model = Model({'a': (3, 2)}, {('start', 'a'): (2, 2), ('a', 'end'): (2, 2)})
+    for arr in [model._node_codes, model._node_freq, model._edge_codes,
+                model._edge_freq]:
+        with pytest.raises(ValueError):
+            arr[0] = 0
+    restored = pickle.loads(pickle.dumps(model))
+    with pytest.raises(ValueError):
+        restored._edge_freq[0, 0] = 0
+    with pytest.raises(AttributeError):
+        model.rates = (0, 0)
+    with pytest.raises(AttributeError):
+        del model.codebook
@@ -0,0 +1,32 @@
+import pytest
+from ngram import NGramIndex
+
+def naive_relations(flat_log, k):
+    relations, cases = dict(), dict()
+    for case, trace in flat_log.items():
+        for i in range(len(trace) - k + 1):
+            pattern = tuple(trace[i:i+k])
+            relations[pattern] = relations.get(pattern, 0) + 1
+            cases.setdefault(pattern, set()).add(case)
+    return {r: (n, len(cases[r])) for r, n in relations.items()}
+
+@pytest.mark.parametrize('k', [1, 2, 3, 4])
+def test_relations_same_as_naive_counts(log, k):
+    index = NGramIndex(log, max_k=4)
+    expected = naive_relations(log.flat_log, k)
+    assert index.relations(k) == expected
+    for pattern, freq in list(expected.items())[:20]:
+        assert index.count(pattern) == freq
+
+def test_relations_filtered_by_case_frequency(log):
+    index = NGramIndex(log, max_k=2)
+    relations = index.relations(2, min_case_freq=10)
+    assert relations
+    assert relations == {r: f for r, f in index.relations(2).items() if f[1] >= 10}
+
+def test_absent_relations(log):
+    index = NGramIndex(log, max_k=2)
+    a = index.activities[0]
+    assert index.count((a, 'no such activity')) == (0, 0)
+    with pytest.raises(ValueError):
+        index.count((a, a, a))
@@ -0,0 +1,33 @@
+import pytest
+from process_map import ProcessMap
+from parallel import ParallelBackend
+
+def discover(log, workers, **params):
+    pm = ProcessMap()
+    pm.set_log(log)
+    pm.set_params(workers=workers, **params)
+    try:
+        pm.update()
+        return pm.get_rates(), pm.get_model(), pm.get_durations()
+    finally:
+        pm.close()
+
+@pytest.mark.parametrize('params', [
+    {'step': 20},
+    {'optimize': False, 'aggregate': True, 'cycle_rel': 0.3},
+    {'optimize': False, 'aggregate': True, 'agg_type': 'inner', 'cycle_rel': 0.3},
+])
+def test_parallel_same_as_serial(log, params):
+    rates, model, durations = discover(log, None, **params)
+    assert durations
+    assert discover(log, 2, **params) == (rates, model, durations)
+
+def test_aggregation_searches_cycles_in_parallel(log, monkeypatch):
+    calls = []
+    find_cycles = ParallelBackend.find_cycles
+    def spy(self, *args, **kwargs):
+        calls.append(args)
+        return find_cycles(self, *args, **kwargs)
+    monkeypatch.setattr(ParallelBackend, 'find_cycles', spy)
+    discover(log, 2, optimize=False, aggregate=True)
+    assert len(calls) == 1
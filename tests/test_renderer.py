@@ -0,0 +1,34 @@
+import pytest
+from graph import Graph
+from transition_matrix import TransitionMatrix
+from renderer import _level_of_detail
+
+@pytest.fixture(scope='module')
+def model(log):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    G = Graph()
+    G.update(log, 100, 100, TM)
+    F = {a: freq[0] for a, freq in G.nodes.items()}
+    return G.nodes, G.edges, F
+
+@pytest.mark.parametrize('max_nodes', [None, 5])
+@pytest.mark.parametrize('max_edges', [0, 1, 5, 15])
+def test_level_of_detail_keeps_nodes_connected(model, max_nodes, max_edges):
+    nodes, edges, F, _, dropped = _level_of_detail(*model, max_nodes, max_edges)
+    assert dropped > 0
+    targets = {a_j for a_i, a_j in edges if a_i != a_j}
+    sources = {a_i for a_i, a_j in edges if a_i != a_j}
+    for v in list(nodes) + ['start', 'end']:
+        if v != 'start':
+            assert v in targets, v
+        if v != 'end':
+            assert v in sources, v
+
+def test_level_of_detail_keeps_most_frequent_edges(model):
+    nodes, edges, F = model
+    _, kept, _, _, dropped = _level_of_detail(nodes, edges, F, None, 20)
+    assert len(kept) >= 20
+    assert len(kept) + dropped == len(edges)
+    top = sorted(edges, key=lambda e: edges[e][0], reverse=True)[:5]
+    assert set(top) <= set(kept)
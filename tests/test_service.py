@@ -0,0 +1,62 @@
+import json
+import urllib.request
+import urllib.error
+import pytest
+from service import DiscoveryService
+from conftest import LOG_PATH
+
+def post(url, body):
+    request = urllib.request.Request(url, json.dumps(body).encode('utf-8'),
+                                     {'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+@pytest.fixture
+def service(tmp_path):
+    service = DiscoveryService(port=0, cache=str(tmp_path / 'cache')).start()
+    status, _ = post(service.url + '/logs', {'id': 'monitoring', 'path': LOG_PATH,
+                                             'read_kwargs': {'encoding': 'cp1251'}})
+    assert status == 201
+    yield service
+    service.stop()
+
+def test_cache_is_not_set_by_clients(service, tmp_path):
+    status, body = post(service.url + '/discover',
+                        {'log': 'monitoring',
+                         'params': {'step': 50, 'cache': str(tmp_path / 'other')}})
+    assert status == 400
+    assert 'cache' in body['error']
+    assert not (tmp_path / 'other').exists()
+
+def test_optimization_uses_server_cache(service):
+    body = {'log': 'monitoring', 'params': {'step': 50}}
+    status, first = post(service.url + '/discover', body)
+    assert status == 200
+    assert len(service.cache) == 1
+    status, second = post(service.url + '/discover', body)
+    assert (first['rates'], first['edges']) == (second['rates'], second['edges'])
+
+def test_workers_are_not_set_by_clients(service):
+    status, body = post(service.url + '/discover',
+                        {'log': 'monitoring',
+                         'params': {'optimize': False, 'workers': 2}})
+    assert status == 400
+    assert 'workers' in body['error']
+
+def test_discovery_closes_process_map(log, monkeypatch):
+    import service as service_module
+    from process_map import ProcessMap
+    closed = []
+    close = ProcessMap.close
+    def spy(self):
+        closed.append(self)
+        close(self)
+    monkeypatch.setattr(ProcessMap, 'close', spy)
+    with pytest.raises(service_module.ServiceError):
+        service_module.discover(log, params={'no such parameter': 1})
+    response = service_module.discover(log, params={'optimize': False})
+    assert response['rates']
+    assert len(closed) == 2
@@ -0,0 +1,31 @@
+import pytest
+from transition_matrix import TransitionMatrix
+from util_pm import transit_matrix, node_significance
+from sharding import shard_cases, spanning_cases, partial_transit, merge_partials
+
+def shards_of(flat_log, n):
+    """Split every trace into n consecutive parts, one per shard."""
+    shards = [dict() for _ in range(n)]
+    for case, trace in flat_log.items():
+        size = -(-len(trace) // n)
+        for i in range(n):
+            if trace[i*size:(i+1)*size]:
+                shards[i][case] = trace[i*size:(i+1)*size]
+    return shards
+
+@pytest.mark.parametrize('handshake', [True, False])
+def test_merged_shards_same_as_full_matrix(log, handshake):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    T = transit_matrix(log, TM.T)
+    shards = shards_of(log.flat_log, 3)
+    spanning = None
+    if handshake:
+        spanning = spanning_cases([shard_cases(s) for s in shards])
+        assert spanning
+    partials = [partial_transit(s, i, spanning) for i, s in enumerate(shards)]
+    merged = merge_partials(partials[::-1])
+    assert merged.transit_matrix() == T
+    assert merged.node_significance() == pytest.approx(node_significance(log))
+    assert merged.log().cases == set(log.flat_log)
+    assert merged.log().activities == log.activities
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from log import Log
+from graph import Graph
+from transition_matrix import TransitionMatrix
+from util_pm import transit_matrix, node_significance
+from stability import VariantStatistics, bootstrap_stability
+
+def discover(log, rates):
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    G = Graph()
+    G.update(log, *rates, TM)
+    return G
+
+def test_resample_with_counts_same_as_log(log):
+    stats = VariantStatistics(log)
+    T, S = stats.resample(stats.counts)
+    TM = TransitionMatrix()
+    TM.update(log.flat_log)
+    assert T == transit_matrix(log, TM.T)
+    assert S == pytest.approx(node_significance(log))
+
+def test_bootstrap_stability_same_as_resampled_logs(log):
+    rates, n_boot = (80, 30), 20
+    stability = bootstrap_stability(log, *rates, n_boot=n_boot, seed=0)
+    assert stability == bootstrap_stability(log, *rates, n_boot=n_boot, seed=0)
+    G = discover(log, rates)
+    in_model = {e for e, v in stability['edges'].items() if v['in_model']}
+    assert in_model == set(G.edges)
+    # The same resamples as materialized logs
+    stats = VariantStatistics(log)
+    rng = np.random.default_rng(0)
+    case_cnt = int(stats.counts.sum())
+    presence = dict()
+    for _ in range(n_boot):
+        weights = rng.multinomial(case_cnt, stats.counts / case_cnt)
+        resample = Log()
+        resample.flat_log = {(v, i): trace
+                             for v, trace in enumerate(stats.traces)
+                             for i in range(weights[v])}
+        resample.cases = set(resample.flat_log)
+        resample.activities = {a for t in resample.flat_log.values() for a in t}
+        for e in discover(resample, rates).edges:
+            presence[e] = presence.get(e, 0) + 1
+    assert set(stability['edges']) == set(presence) | set(G.edges)
+    always = [e for e, n in presence.items() if n == n_boot]
+    assert always
+    for e in always:
+        assert stability['edges'][e]['presence'] == 1.0
+    for e, n in presence.items():
+        assert stability['edges'][e]['presence'] == n / n_boot
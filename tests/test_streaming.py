@@ -0,0 +1,64 @@
+import pytest
+from streaming import SpaceSaving, StreamingTransitionMatrix
+
+def events_of(log):
+    """Events of the log as (case, activity) in the order of traces."""
+    return [(case, a) for case, trace in log.flat_log.items() for a in trace]
+
+@pytest.mark.parametrize('capacity', [5, 20, 100])
+def test_space_saving_error_bound(log, capacity):
+    sketch, true = SpaceSaving(capacity), dict()
+    for case, trace in log.flat_log.items():
+        for pair in zip(trace, trace[1:]):
+            sketch.add(pair)
+            true[pair] = true.get(pair, 0) + 1
+    N = sum(true.values())
+    assert sketch.total == N
+    assert sketch.error_bound() == N / capacity
+    assert len(sketch.counts) <= capacity
+    for key, count in sketch.counts.items():
+        assert true[key] <= count <= true[key] + sketch.errors[key]
+        assert sketch.errors[key] <= N / capacity
+    for key, count in true.items():
+        if count > N / capacity:
+            assert key in sketch
+        else:
+            assert (key in sketch) or (count <= min(sketch.counts.values()))
+
+def test_exact_with_large_capacity(log):
+    STM = StreamingTransitionMatrix(capacity=10000)
+    STM.update(events_of(log))
+    T = STM.transit_matrix()
+    starts = dict()
+    for trace in log.flat_log.values():
+        starts[trace[0]] = starts.get(trace[0], 0) + 1
+    assert T['start'] == {s: (n, n) for s, n in starts.items()}
+    assert sum(T[a]['end'][0] for a in T if 'end' in T[a]) == len(log.flat_log)
+    assert STM.case_cnt == len(log.flat_log)
+
+def test_idle_cases_are_closed_as_ends():
+    STM = StreamingTransitionMatrix(idle_timeout=10)
+    STM.update([(1, 'a', 0), (1, 'b', 1), (2, 'a', 5), (2, 'c', 8)])
+    assert list(STM.open_cases) == [1, 2]
+    STM.add(3, 'a', 12) # case 1 is idle for 11
+    assert list(STM.open_cases) == [2, 3]
+    assert STM.ends.counts == {'b': 1}
+    STM.add(2, 'b', 18) # case 2 is idle for 10 only
+    STM.add(3, 'c', 20)
+    assert list(STM.open_cases) == [2, 3]
+    T = STM.transit_matrix()
+    assert T['b']['end'] == (2, 2) # open case 2 ends with its last activity
+    assert T['c']['end'] == (1, 1)
+    STM.evict(29)
+    assert list(STM.open_cases) == [3]
+    assert STM.ends.counts == {'b': 2}
+
+def test_too_many_open_cases_are_closed_as_ends():
+    STM = StreamingTransitionMatrix(max_open_cases=2)
+    STM.update([(1, 'a'), (1, 'b'), (2, 'a'), (3, 'c'), (2, 'd'), (4, 'a')])
+    assert list(STM.open_cases) == [2, 4]
+    assert STM.ends.counts == {'b': 1, 'c': 1}
+    # A closed case that appears again is counted as a new case
+    STM.add(1, 'e')
+    assert STM.case_cnt == 5
+    assert STM.starts.counts == {'a': 3, 'c': 1, 'e': 1}
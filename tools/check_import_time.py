@@ -0,0 +1,46 @@
+"""Check that importing ProFIT fits into a time budget and does not
+load heavy dependencies that are needed only for XES reading or
+rendering.
+
+Usage: python tools/check_import_time.py [BUDGET_SECONDS] [RUNS]
+"""
+import os, sys
+import subprocess
+
+PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = 1.0 # seconds
+HEAVY = ['pm4py', 'graphviz', 'pandas', 'scipy', 'pyarrow']
+
+CODE = """
+import sys, time
+sys.path[:0] = [{0!r}, {1!r}]
+t = time.perf_counter()
+import profit
+t = time.perf_counter() - t
+print(t)
+print(','.join(m for m in {2!r} if m in sys.modules))
+""".format(PATH, os.path.join(PATH, 'profit'), HEAVY)
+
+def import_time():
+    """Import the package in a fresh interpreter. Return import
+    time (in seconds) and heavy modules loaded during import."""
+    out = subprocess.run([sys.executable, '-c', CODE], check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True)
+    t, loaded = out.stdout.split('\n')[:2]
+    return float(t), [m for m in loaded.split(',') if m]
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    results = [import_time() for _ in range(runs)]
+    # The best run excludes cold disk cache effects
+    t = min(r[0] for r in results)
+    loaded = sorted({m for r in results for m in r[1]})
+    print('Import time: {0:.3f}s (budget {1:.3f}s)'.format(t, budget))
+    if loaded:
+        print('Heavy modules loaded on import: ' + ', '.join(loaded))
+    if (t > budget) | bool(loaded):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()